@@ -0,0 +1,77 @@
+"""Memory-mapped storage for chunk texts and metadata.
+
+Strings are stored as one UTF-8 blob plus an offset table:
+
+    <name>.bin          concatenated UTF-8 strings
+    <name>.offsets.npy  int64 offsets, one more than the number of strings
+
+Files are mapped read-only, so every process that opens the same index
+shares a single copy of the corpus through the OS page cache. A string is
+only decoded when it is accessed.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+
+def write_strings(path: str | Path, name: str, strings: Iterable[str]) -> None:
+    """Write strings as <name>.bin and <name>.offsets.npy under path."""
+    path = Path(path)
+    lengths = [0]
+    with (path / f"{name}.bin").open("wb") as f:
+        for string in strings:
+            data = string.encode("utf-8")
+            f.write(data)
+            lengths.append(len(data))
+    np.save(path / f"{name}.offsets.npy", np.cumsum(lengths, dtype=np.int64))
+
+
+def write_json(path: str | Path, name: str, values: Iterable[Any]) -> None:
+    """Write one JSON document per value, in the write_strings format."""
+    write_strings(path, name, (json.dumps(value, ensure_ascii=False) for value in values))
+
+
+class MappedStrings(Sequence):
+    """Read-only sequence of strings backed by a memory-mapped blob."""
+
+    def __init__(self, path: str | Path, name: str) -> None:
+        path = Path(path)
+        self._offsets = np.load(path / f"{name}.offsets.npy", mmap_mode="r")
+        with (path / f"{name}.bin").open("rb") as f:
+            if self._offsets[-1] > 0:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._blob = b""  # mmap cannot map an empty file
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _decode(self, i: int) -> str:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+    def __getitem__(self, i: int) -> Any:  # type: ignore[override]
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._decode(i)
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(len(self)):
+            yield self._decode(i)
+
+
+class MappedJSON(MappedStrings):
+    """Read-only sequence of JSON values, parsed on access."""
+
+    def _decode(self, i: int) -> Any:
+        return json.loads(super()._decode(i))
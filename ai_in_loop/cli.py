@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import time
+from typing import NamedTuple
+
 import typer
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage
 from rich.console import Console
 
 from .config import Config
-from .graph import build_app
-from .llm import get_text
+from .graph import build_app, tool_metrics
+from .llm import get_delta_text, get_text
 from .logging_utils import log_event, new_run_id
 
 
@@ -24,6 +27,74 @@ def _format_tool_calls(tool_calls: list) -> str:
     return ", ".join(parts)
 
 
+class _Turn(NamedTuple):
+    """Outcome of one streamed run of the graph."""
+
+    messages: list  # Messages added by the graph, in order
+    ttft_seconds: float | None  # Until the first response token; None if no text
+    elapsed_seconds: float
+
+
+def _stream_turn(graph_app, messages: list, run_id: str, label: str = "") -> _Turn:
+    """Run the graph, printing response tokens and tool activity as they arrive.
+
+    Tokens come from the "messages" stream of the agent node; complete
+    messages, which carry the tool calls and results, come from the
+    "updates" stream.
+    """
+    new_messages = []
+    ttft = None
+    in_response = False  # a response line is being printed
+    start = time.perf_counter()
+
+    for mode, data in graph_app.stream(
+        {"messages": messages},
+        config={"metadata": {"run_id": run_id}},  # tags tool cache hits in the log
+        stream_mode=["messages", "updates"],
+    ):
+        if mode == "messages":
+            chunk, metadata = data
+            if metadata.get("langgraph_node") != "agent":
+                continue
+            text = get_delta_text(chunk)
+            if not in_response:
+                text = text.lstrip()
+            if not text:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            if not in_response:
+                console.print(label, end="")
+                in_response = True
+            console.print(text, end="", markup=False, highlight=False)
+            continue
+
+        for update in data.values():
+            for msg in (update or {}).get("messages", []):
+                new_messages.append(msg)
+                if in_response:
+                    console.print()
+                    in_response = False
+                if msg.type == "ai" and msg.tool_calls:
+                    console.print(f"[dim]Tool call: {_format_tool_calls(msg.tool_calls)}[/dim]")
+                elif msg.type == "tool":
+                    console.print(f"[dim]Tool result: {msg.content}[/dim]")
+
+    if in_response:
+        console.print()
+    return _Turn(new_messages, ttft, time.perf_counter() - start)
+
+
+def _write_metrics(cfg: Config) -> None:
+    """Refresh the Prometheus metrics file, if one is configured."""
+    if not cfg.metrics_file:
+        return
+    try:
+        tool_metrics().write_prometheus(cfg.metrics_file)
+    except OSError as e:
+        console.print(f"[yellow]Could not write metrics file '{cfg.metrics_file}': {e}[/yellow]")
+
+
 @app.command()
 def demo(prompt: str = "Say hello in 1 sentence.") -> None:
     """Run a single prompt through the starter graph."""
@@ -32,34 +103,24 @@ def demo(prompt: str = "Say hello in 1 sentence.") -> None:
 
     run_id = new_run_id()
 
-    # Run graph and get full message list
+    # Run graph, printing the response as it streams in
     graph_app = build_app(cfg)
-    result = graph_app.invoke({"messages": [HumanMessage(content=prompt)]})
-    messages = result["messages"]
+    turn = _stream_turn(graph_app, [HumanMessage(content=prompt)], run_id)
 
-    # Display messages following the pattern from slides
     tool_calls_logged = []
     tool_results_logged = []
     final_response = ""
 
-    for msg in messages:
-        if msg.type == "human":
-            continue
-        elif msg.type == "ai":
+    for msg in turn.messages:
+        if msg.type == "ai":
             if hasattr(msg, "tool_calls") and msg.tool_calls:
-                formatted = _format_tool_calls(msg.tool_calls)
-                console.print(f"[dim]Tool call: {formatted}[/dim]")
                 tool_calls_logged.extend(msg.tool_calls)
             content = get_text(msg)
             if content:
                 final_response = content
         elif msg.type == "tool":
-            console.print(f"[dim]Tool result: {msg.content}[/dim]")
             tool_results_logged.append(msg.content)
 
-    if final_response:
-        console.print(final_response)
-
     log_event(
         {
             "run_id": run_id,
@@ -71,11 +132,14 @@ def demo(prompt: str = "Say hello in 1 sentence.") -> None:
                 for tc in tool_calls_logged
             ],
             "tool_results": tool_results_logged,
+            "ttft_seconds": turn.ttft_seconds,
+            "elapsed_seconds": turn.elapsed_seconds,
             "use_gemini": cfg.use_gemini,
             "gemini_model": cfg.gemini_model,
             "temperature": cfg.temperature,
         }
     )
+    _write_metrics(cfg)
 
 
 def _read_multiline_input() -> str:
@@ -115,42 +179,33 @@ def chat() -> None:
 
         run_id = new_run_id()
 
-        # Track message count before invoke
-        num_messages_before = len(conversation_messages)
-
         # Add new message and pass FULL history
         conversation_messages.append(HumanMessage(content=prompt))
-        result = graph_app.invoke({"messages": conversation_messages})
+        console.print()
+        turn = _stream_turn(graph_app, conversation_messages, run_id, "[bold green]Model>[/bold green] ")
 
         # Update history with result
-        conversation_messages = result["messages"]
+        conversation_messages = conversation_messages + turn.messages
 
-        # Display only NEW messages (after the human message we just added)
-        console.print()
         tool_calls_logged = []
         tool_results_logged = []
         final_response = ""
 
-        # Skip messages we've already seen (everything before this turn)
-        new_messages = result["messages"][num_messages_before + 1:]  # +1 to skip the human message
-        for msg in new_messages:
+        for msg in turn.messages:
             if msg.type == "ai":
                 # Check for tool calls
                 if hasattr(msg, "tool_calls") and msg.tool_calls:
-                    formatted = _format_tool_calls(msg.tool_calls)
-                    console.print(f"[dim]Tool call: {formatted}[/dim]")
                     tool_calls_logged.extend(msg.tool_calls)
                 # Check for final response content
                 content = get_text(msg)
                 if content:
                     final_response = content
             elif msg.type == "tool":
-                console.print(f"[dim]Tool result: {msg.content}[/dim]")
                 tool_results_logged.append(msg.content)
 
-        # Show final response
+        # The response was shown while it streamed in
         if final_response:
-            console.print(f"[bold green]Model>[/bold green] {final_response}\n")
+            console.print()
         elif tool_calls_logged:
             # Model called tools but didn't generate a response
             console.print("[yellow]Model searched but didn't generate a response. Try rephrasing your question.[/yellow]\n")
@@ -170,11 +225,14 @@ def chat() -> None:
                     for tc in tool_calls_logged
                 ],
                 "tool_results": tool_results_logged,
+                "ttft_seconds": turn.ttft_seconds,
+                "elapsed_seconds": turn.elapsed_seconds,
                 "use_gemini": cfg.use_gemini,
                 "gemini_model": cfg.gemini_model,
                 "temperature": cfg.temperature,
             }
         )
+        _write_metrics(cfg)
 
 
 if __name__ == "__main__":
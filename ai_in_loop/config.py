@@ -18,6 +18,19 @@ class Config:
     resources_dir: str
     chunk_size: int
     chunk_overlap: int
+    index_cache_dir: str | None = None  # None = "<resources_dir>/.index"
+    ingest_workers: int = 1  # Processes for loading/chunking; 0 = one per CPU
+    search_backend: str = "postings"  # "postings" (MaxScore) or "matrix" (vectorized)
+    dense_embedder: str | None = None  # Enables hybrid search: "hashing" or "module:factory"
+    search_k: int = 3  # Chunks returned by search_docs
+    search_min_score: float | None = None  # Drop chunks scoring below this
+    search_max_chars: int | None = None  # Character budget for search_docs output
+    query_cache_size: int = 256  # Cached search_docs results; 0 = disabled
+    query_cache_ttl: float | None = None  # Seconds; None = no expiry
+    calc_workers: int = 0  # Worker processes for python_calc; 0 = evaluate in-process
+    calc_timeout: float = 2.0  # Seconds a python_calc evaluation may run
+    tool_cache_size: int = 256  # Memoized tool results shared across runs; 0 = disabled
+    metrics_file: str | None = None  # Prometheus text dump of tool metrics, rewritten after each run
 
     @staticmethod
     def from_env() -> "Config":
@@ -81,6 +94,81 @@ class Config:
             print("Warning: CHUNK_OVERLAP is not a valid integer, using 100", file=sys.stderr)
             chunk_overlap = 100
 
+        index_cache_dir = os.getenv("INDEX_CACHE_DIR", "").strip() or None
+
+        try:
+            ingest_workers = int(os.getenv("INGEST_WORKERS", "1").strip())
+            ingest_workers = max(0, min(ingest_workers, 64))
+        except ValueError:
+            print("Warning: INGEST_WORKERS is not a valid integer, using 1", file=sys.stderr)
+            ingest_workers = 1
+
+        search_backend = os.getenv("SEARCH_BACKEND", "postings").strip().lower()
+        if search_backend not in {"postings", "matrix"}:
+            print(f"Warning: SEARCH_BACKEND '{search_backend}' is not valid (use postings/matrix), using postings", file=sys.stderr)
+            search_backend = "postings"
+
+        dense_embedder = os.getenv("DENSE_EMBEDDER", "").strip() or None
+
+        try:
+            search_k = int(os.getenv("SEARCH_K", "3").strip())
+            search_k = max(1, min(search_k, 50))
+        except ValueError:
+            print("Warning: SEARCH_K is not a valid integer, using 3", file=sys.stderr)
+            search_k = 3
+
+        min_score_str = os.getenv("SEARCH_MIN_SCORE", "").strip()
+        try:
+            search_min_score = float(min_score_str) if min_score_str else None
+        except ValueError:
+            print(f"Warning: SEARCH_MIN_SCORE '{min_score_str}' is not a valid number, using no cutoff", file=sys.stderr)
+            search_min_score = None
+
+        max_chars_str = os.getenv("SEARCH_MAX_CHARS", "").strip()
+        try:
+            search_max_chars = int(max_chars_str) if max_chars_str else None
+            if search_max_chars is not None and search_max_chars <= 0:
+                search_max_chars = None
+        except ValueError:
+            print(f"Warning: SEARCH_MAX_CHARS '{max_chars_str}' is not a valid integer, using no limit", file=sys.stderr)
+            search_max_chars = None
+
+        try:
+            query_cache_size = max(0, int(os.getenv("QUERY_CACHE_SIZE", "256").strip()))
+        except ValueError:
+            print("Warning: QUERY_CACHE_SIZE is not a valid integer, using 256", file=sys.stderr)
+            query_cache_size = 256
+
+        query_cache_ttl_str = os.getenv("QUERY_CACHE_TTL", "").strip()
+        try:
+            query_cache_ttl = float(query_cache_ttl_str) if query_cache_ttl_str else None
+        except ValueError:
+            print(f"Warning: QUERY_CACHE_TTL '{query_cache_ttl_str}' is not a valid number, using no expiry", file=sys.stderr)
+            query_cache_ttl = None
+
+        try:
+            calc_workers = int(os.getenv("CALC_WORKERS", "0").strip())
+            calc_workers = max(0, min(calc_workers, 32))
+        except ValueError:
+            print("Warning: CALC_WORKERS is not a valid integer, using 0", file=sys.stderr)
+            calc_workers = 0
+
+        try:
+            calc_timeout = float(os.getenv("CALC_TIMEOUT", "2").strip())
+            if calc_timeout <= 0:
+                raise ValueError
+        except ValueError:
+            print("Warning: CALC_TIMEOUT is not a positive number, using 2", file=sys.stderr)
+            calc_timeout = 2.0
+
+        try:
+            tool_cache_size = max(0, int(os.getenv("TOOL_CACHE_SIZE", "256").strip()))
+        except ValueError:
+            print("Warning: TOOL_CACHE_SIZE is not a valid integer, using 256", file=sys.stderr)
+            tool_cache_size = 256
+
+        metrics_file = os.getenv("METRICS_FILE", "").strip() or None
+
         return Config(
             use_gemini=use_gemini,
             gemini_api_key=gemini_api_key,
@@ -92,4 +180,17 @@ class Config:
             resources_dir=resources_dir,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
+            index_cache_dir=index_cache_dir,
+            ingest_workers=ingest_workers,
+            search_backend=search_backend,
+            dense_embedder=dense_embedder,
+            search_k=search_k,
+            search_min_score=search_min_score,
+            search_max_chars=search_max_chars,
+            query_cache_size=query_cache_size,
+            query_cache_ttl=query_cache_ttl,
+            calc_workers=calc_workers,
+            calc_timeout=calc_timeout,
+            tool_cache_size=tool_cache_size,
+            metrics_file=metrics_file,
         )
@@ -0,0 +1,253 @@
+"""Dense-vector retrieval for hybrid search.
+
+Chunks are embedded with a pluggable embedder and stored in an IVF
+(inverted file) approximate nearest-neighbor index: a spherical k-means
+quantizer splits the vectors into lists, and a query only scans the lists
+of its closest centroids. Dense and BM25 results are merged with
+reciprocal-rank fusion.
+
+An embedder is any object with a ``name`` attribute (used in cache keys)
+and an ``embed(texts) -> np.ndarray`` method returning one L2-normalized
+float32 row per text. ``HashingEmbedder`` is a deterministic offline
+embedder for tests and setups without a model.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib
+import json
+import re
+import shutil
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Sequence
+
+import numpy as np
+
+DENSE_FORMAT_VERSION = 1
+
+# IVF parameters
+NPROBE = 8  # Lists scanned per query
+TRAIN_SAMPLE = 50_000  # Vectors used to train the quantizer
+KMEANS_ITERATIONS = 10
+
+# Reciprocal-rank fusion constant (Cormack et al.)
+RRF_K = 60
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_slot(feature: str, dim: int) -> tuple[int, float]:
+    """Stable (bucket, sign) for a feature; Python's hash() is salted per process."""
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, 1.0 if h >> 63 else -1.0
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder over words and character trigrams.
+
+    Trigrams let related word forms ("optimize", "optimization") share
+    dimensions, which gives some robustness to paraphrasing without a model.
+    """
+
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD_RE.findall(text.lower()):
+                bucket, sign = _feature_slot(word, self.dim)
+                vectors[row, bucket] += sign
+                padded = f"<{word}>"
+                for i in range(len(padded) - 2):
+                    bucket, sign = _feature_slot(padded[i:i + 3], self.dim)
+                    vectors[row, bucket] += 0.5 * sign
+        return _normalize(vectors)
+
+
+def load_embedder(spec: str) -> Any:
+    """Create an embedder from a spec string.
+
+    "hashing" or "hashing:<dim>" selects HashingEmbedder; "module:attr"
+    imports attr from module and calls it with no arguments.
+    """
+    name, _, arg = spec.partition(":")
+    if name == "hashing":
+        return HashingEmbedder(int(arg) if arg else 256)
+    module = importlib.import_module(name)
+    return getattr(module, arg)()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class DenseIndex:
+    """IVF index over chunk embeddings, aligned with BM25Index doc ids."""
+
+    def __init__(
+        self,
+        embedder: Any,
+        vectors: np.ndarray,
+        text_hashes: np.ndarray,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_ids: np.ndarray,
+    ) -> None:
+        self.embedder = embedder
+        self.vectors = vectors
+        self.text_hashes = text_hashes
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.generation: str | None = None
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, embedder: Any, texts: Sequence[str], previous: "DenseIndex | None" = None) -> "DenseIndex":
+        """Embed texts and train the IVF quantizer.
+
+        Vectors of chunks whose text is unchanged are reused from previous,
+        so after an incremental re-index only new chunks are embedded.
+        """
+        hashes = np.array([_text_hash(text) for text in texts], dtype="S16")
+
+        rows: list[int | None] = [None] * len(texts)
+        if previous is not None:
+            known = {h: row for row, h in enumerate(previous.text_hashes.tolist())}
+            rows = [known.get(h) for h in hashes.tolist()]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        reused = [i for i, row in enumerate(rows) if row is not None]
+
+        if missing:
+            embedded = np.asarray(embedder.embed([texts[i] for i in missing]), dtype=np.float32)
+            dim = embedded.shape[1]
+        else:
+            dim = previous.vectors.shape[1] if previous is not None else getattr(embedder, "dim", 1)
+        vectors = np.zeros((len(texts), dim), dtype=np.float32)
+        if reused:
+            vectors[reused] = previous.vectors[[rows[i] for i in reused]]
+        if missing:
+            vectors[missing] = embedded
+
+        centroids = _train_centroids(vectors)
+        list_offsets, list_ids = _assign_lists(vectors, centroids)
+        return cls(embedder, vectors, hashes, centroids, list_offsets, list_ids)
+
+    def search(self, queries: Sequence[str], k: int) -> list[list[tuple[int, float]]]:
+        """Approximate top-k (doc_id, cosine similarity) per query."""
+        if not len(self) or k <= 0:
+            return [[] for _ in queries]
+
+        query_vectors = _normalize(np.asarray(self.embedder.embed(list(queries)), dtype=np.float32))
+        nprobe = min(NPROBE, len(self.centroids))
+        probes = np.argsort(-(query_vectors @ self.centroids.T), axis=1)[:, :nprobe]
+
+        results = []
+        for query_vector, lists in zip(query_vectors, probes):
+            ids = np.concatenate([
+                self.list_ids[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists
+            ])
+            scores = self.vectors[ids] @ query_vector
+            if len(ids) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                ids, scores = ids[top], scores[top]
+            order = np.lexsort((ids, -scores))
+            results.append([(int(ids[i]), float(scores[i])) for i in order])
+        return results
+
+    def save(self, path: str | Path, key: dict[str, Any]) -> None:
+        """Write a new generation and atomically point the manifest at it."""
+        path = Path(path)
+        generation = f"gen-{time.time_ns()}"
+        data_dir = path / generation
+        data_dir.mkdir(parents=True)
+        for name in ("vectors", "text_hashes", "centroids", "list_offsets", "list_ids"):
+            np.save(data_dir / f"{name}.npy", getattr(self, name))
+
+        manifest = {"version": DENSE_FORMAT_VERSION, "key": key, "generation": generation}
+        tmp_path = path / f"manifest.json.{generation}.tmp"
+        tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        tmp_path.replace(path / "manifest.json")
+        self.generation = generation
+
+        for old in path.glob("gen-*"):
+            if old.name != generation:
+                shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str | Path, embedder: Any, key: dict[str, Any] | None) -> "DenseIndex | None":
+        """Map a saved index. With key=None any saved generation is accepted."""
+        path = Path(path)
+        try:
+            manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+            if manifest.get("version") != DENSE_FORMAT_VERSION:
+                return None
+            if key is not None and manifest.get("key") != key:
+                return None
+            data_dir = path / manifest["generation"]
+            arrays = {
+                name: np.load(data_dir / f"{name}.npy", mmap_mode="r")
+                for name in ("vectors", "text_hashes", "centroids", "list_offsets", "list_ids")
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+
+        dense = cls(embedder, **arrays)
+        dense.generation = manifest["generation"]
+        return dense
+
+
+def _train_centroids(vectors: np.ndarray) -> np.ndarray:
+    """Spherical k-means on a sample, with about sqrt(N) lists."""
+    num_lists = max(1, min(1024, int(np.sqrt(len(vectors)))))
+    if len(vectors) == 0:
+        return np.zeros((1, vectors.shape[1]), dtype=np.float32)
+
+    rng = np.random.default_rng(0)
+    sample = vectors
+    if len(vectors) > TRAIN_SAMPLE:
+        sample = vectors[np.sort(rng.choice(len(vectors), TRAIN_SAMPLE, replace=False))]
+    centroids = sample[rng.choice(len(sample), num_lists, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=num_lists)
+        occupied = counts > 0  # empty lists keep their previous centroid
+        centroids[occupied] = _normalize(sums[occupied])
+    return centroids
+
+
+def _assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Group vector ids by nearest centroid, as CSR offsets + ids."""
+    assignment = np.concatenate([
+        np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), 65536)
+    ] or [np.empty(0, dtype=np.int64)])
+    list_ids = np.argsort(assignment, kind="stable").astype(np.int32)
+    list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+    list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=len(centroids)))
+    return list_offsets, list_ids
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[tuple[int, float]]], k: int) -> list[tuple[int, float]]:
+    """Merge ranked (doc_id, score) lists by summing 1 / (RRF_K + rank)."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]
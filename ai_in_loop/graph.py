@@ -8,19 +8,145 @@ Graph structure:
     START → agent → [tools_condition] → tools → agent (loop) → END
 """
 
+import asyncio
+from collections import OrderedDict
+import threading
+from typing import Any
+
 from langgraph.graph import StateGraph, START
 from langgraph.graph.message import MessagesState
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.tools import BaseTool, StructuredTool
 
 from .config import Config
 from .llm import get_llm, load_system_prompt, get_text
-from .tools import python_calc, search_docs, set_search_config
+from .metrics import MetricsRegistry, instrument_tool
+from .retriever import corpus_version
+from .tool_cache import ToolCache, memoize_tool
+from .tools import python_calc, python_calc_batch, search_docs, set_calc_config, set_search_config
 
 
 # List of available tools
-TOOLS = [python_calc, search_docs]
+TOOLS = [python_calc, python_calc_batch, search_docs]
+
+# Tools whose results depend only on their arguments, mapped to a version
+# function for any other state they read (None if there is none). Their
+# results are memoized in a cache shared by all graphs.
+MEMOIZED_TOOLS = {
+    "python_calc": None,
+    "python_calc_batch": None,
+    "search_docs": corpus_version,
+}
+
+_tool_cache = ToolCache()
+_tool_metrics = MetricsRegistry()
+
+# Compiled apps reused by run_once and arun_once, keyed by Config
+MAX_CACHED_APPS = 8
+_app_cache: OrderedDict[Config, CompiledStateGraph] = OrderedDict()
+_app_cache_lock = threading.Lock()
+
+# Concurrent search_docs calls allowed per graph; searches release the GIL
+# on file reads and embedding calls, but each holds a full result list
+SEARCH_CONCURRENCY = 4
+
+
+def tool_cache_stats() -> dict[str, int]:
+    """Size, hit and miss counters of the shared tool result cache."""
+    return _tool_cache.stats()
+
+
+def tool_metrics() -> MetricsRegistry:
+    """Per-tool latency, call, error and payload size metrics of all graphs."""
+    return _tool_metrics
+
+
+def _limit_concurrency(tool: BaseTool, limit: int) -> BaseTool:
+    """Wrap a tool so at most limit calls to it run at once; the rest wait."""
+    slots = threading.BoundedSemaphore(limit)
+
+    def run(config: RunnableConfig, **kwargs: Any) -> Any:
+        with slots:
+            return tool.invoke(kwargs, config)
+
+    async def arun(config: RunnableConfig, **kwargs: Any) -> Any:
+        await _acquire(slots)
+        try:
+            return await tool.ainvoke(kwargs, config)
+        finally:
+            slots.release()
+
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        infer_schema=False,
+    )
+
+
+async def _acquire(slots: threading.BoundedSemaphore) -> None:
+    """Take a slot without blocking the event loop.
+
+    The semaphore is shared by sync and async callers and by every event
+    loop, so when it is full the blocking acquire runs in a thread.
+    """
+    if slots.acquire(blocking=False):
+        return
+    acquired = asyncio.get_running_loop().run_in_executor(None, slots.acquire)
+    try:
+        await asyncio.shield(acquired)
+    except asyncio.CancelledError:
+        # The thread still takes the slot; give it back once it does
+        acquired.add_done_callback(lambda _: slots.release())
+        raise
+
+
+def tool_concurrency(cfg: Config) -> dict[str, int]:
+    """Maximum number of concurrent calls per tool.
+
+    The calculator tools are CPU-bound: with CALC_WORKERS set they run in
+    the worker process pool, and a call beyond the pool size would only
+    queue for a worker (and could time out waiting); without workers they
+    hold the GIL, so running them side by side gains nothing.
+    """
+    calc = max(1, cfg.calc_workers)
+    return {
+        "python_calc": calc,
+        "python_calc_batch": calc,
+        "search_docs": SEARCH_CONCURRENCY,
+    }
+
+
+def build_tool_node(cfg: Config) -> ToolNode:
+    """Build the node that executes the tool calls of an AI message.
+
+    Independent tool calls from one message run concurrently on the
+    node's thread executor and their ToolMessages come back in call
+    order. Each tool is bounded by tool_concurrency, and memoized tools
+    answer cache hits without waiting for a slot. Every call, cache hits
+    included, is recorded in tool_metrics.
+    """
+    limits = tool_concurrency(cfg)
+    tools = []
+    for tool in TOOLS:
+        if tool.name in limits:
+            tool = _limit_concurrency(tool, limits[tool.name])
+        if tool.name in MEMOIZED_TOOLS:
+            tool = memoize_tool(tool, _tool_cache, MEMOIZED_TOOLS[tool.name])
+        tools.append(instrument_tool(tool, _tool_metrics))
+    return ToolNode(tools)
+
+
+def _configure_tools(cfg: Config) -> None:
+    """Initialize config for the search_docs and calculator tools."""
+    set_search_config(cfg)
+    set_calc_config(cfg)
+    _tool_cache.configure(cfg.tool_cache_size)
 
 
 def build_app(cfg: Config) -> CompiledStateGraph:
@@ -41,8 +167,7 @@ def build_app(cfg: Config) -> CompiledStateGraph:
     Returns:
         Compiled LangGraph application ready for invocation
     """
-    # Initialize search config for the search_docs tool
-    set_search_config(cfg)
+    _configure_tools(cfg)
 
     llm = get_llm(cfg)
     system_prompt = load_system_prompt(cfg.system_prompt_file)
@@ -50,27 +175,34 @@ def build_app(cfg: Config) -> CompiledStateGraph:
     # Bind tools to the LLM
     llm_with_tools = llm.bind_tools(TOOLS)
 
+    def prompt_messages(state: MessagesState) -> list:
+        messages = list(state["messages"])
+
+        # Prepend system prompt if configured
+        if system_prompt:
+            messages = [SystemMessage(content=system_prompt)] + messages
+        return messages
+
     def agent(state: MessagesState) -> dict:
         """Process messages and generate a response using the LLM.
 
         The agent node invokes the LLM with the current message history.
         If a system prompt is configured, it's prepended to the messages.
         """
-        messages = list(state["messages"])
-
-        # Prepend system prompt if configured
-        if system_prompt:
-            messages = [SystemMessage(content=system_prompt)] + messages
+        response = llm_with_tools.invoke(prompt_messages(state))
+        return {"messages": [response]}
 
-        response = llm_with_tools.invoke(messages)
+    async def aagent(state: MessagesState) -> dict:
+        """Async agent, used when the graph runs with ainvoke or astream."""
+        response = await llm_with_tools.ainvoke(prompt_messages(state))
         return {"messages": [response]}
 
     # Build the graph
     graph = StateGraph(MessagesState)
 
     # Add nodes
-    graph.add_node("agent", agent)
-    graph.add_node("tools", ToolNode(TOOLS))
+    graph.add_node("agent", RunnableLambda(agent, afunc=aagent, name="agent"))
+    graph.add_node("tools", build_tool_node(cfg))
 
     # Add edges
     graph.add_edge(START, "agent")
@@ -80,12 +212,45 @@ def build_app(cfg: Config) -> CompiledStateGraph:
     return graph.compile()
 
 
+def get_app(cfg: Config) -> CompiledStateGraph:
+    """Return the compiled app for cfg, building it on first use.
+
+    Apps are cached per process, keyed by the whole (frozen, hashable)
+    Config, so repeated callers skip creating the LLM client, reading the
+    system prompt and compiling the graph. The tools are configured for
+    cfg on every call, since their settings are process-wide and another
+    Config may have been used in between.
+
+    The system prompt file is read when the app is built; call
+    clear_app_cache after editing it.
+    """
+    _configure_tools(cfg)
+    with _app_cache_lock:
+        app = _app_cache.get(cfg)
+        if app is not None:
+            _app_cache.move_to_end(cfg)
+            return app
+
+    app = build_app(cfg)
+    with _app_cache_lock:
+        app = _app_cache.setdefault(cfg, app)
+        while len(_app_cache) > MAX_CACHED_APPS:
+            _app_cache.popitem(last=False)
+    return app
+
+
+def clear_app_cache() -> None:
+    """Drop all cached apps; the next get_app call rebuilds."""
+    with _app_cache_lock:
+        _app_cache.clear()
+
+
 def run_once(prompt: str, cfg: Config) -> str:
     """Run a single prompt through the graph and return the response.
 
-    This is the main entry point for processing prompts. It builds a new
-    graph instance, invokes it with the prompt, and extracts the final
-    response text.
+    This is the main entry point for processing prompts. It gets the
+    cached graph for cfg (building it on first use), invokes it with the
+    prompt, and extracts the final response text.
 
     Args:
         prompt: The user's input prompt
@@ -94,11 +259,32 @@ def run_once(prompt: str, cfg: Config) -> str:
     Returns:
         The generated text response
     """
-    app = build_app(cfg)
+    app = get_app(cfg)
     result = app.invoke({"messages": [HumanMessage(content=prompt)]})
+    return _final_text(result["messages"])
+
+
+async def arun_once(prompt: str, cfg: Config) -> str:
+    """Async run_once.
+
+    The LLM is called with ainvoke and tool calls run as coroutines, so
+    many conversations can share one event loop, each waiting on network
+    I/O without holding a thread.
+
+    Args:
+        prompt: The user's input prompt
+        cfg: Configuration object with LLM settings
+
+    Returns:
+        The generated text response
+    """
+    app = get_app(cfg)
+    result = await app.ainvoke({"messages": [HumanMessage(content=prompt)]})
+    return _final_text(result["messages"])
+
 
-    # Extract the final AI message from the conversation
-    messages = result["messages"]
+def _final_text(messages: list) -> str:
+    """Text of the final AI message of a conversation."""
     # Find the last AI message (skip tool messages)
     for msg in reversed(messages):
         if hasattr(msg, "content") and msg.content:
@@ -0,0 +1,478 @@
+"""Inverted BM25 index with an on-disk format.
+
+The index stores one postings list per term (document ids and term
+frequencies), document lengths, and the chunk texts. Every chunk remembers the source file
+it came from, so files can be re-indexed individually. Scores follow
+rank-bm25's ``BM25Okapi`` (the engine behind LangChain's ``BM25Retriever``)
+so results match the original retrieval path.
+
+On-disk layout of an index directory:
+
+    manifest.json       format version, cache key, current generation
+    gen-<n>/            data files of one saved generation:
+        terms.json          vocabulary, in term-id order
+        files.json          per-file size, mtime and content hash
+        term_offsets.npy    postings start per term (CSR indptr)
+        post_docs.npy       document id per posting
+        post_tfs.npy        term frequency per posting
+        doc_lens.npy        tokens per chunk
+        texts.*             chunk texts (see chunk_store)
+        metadata.*          per-chunk metadata as JSON (see chunk_store)
+        sources.*           per-chunk source file name (see chunk_store)
+
+Loaded indexes memory-map these files, so worker processes share them.
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Iterable, Sequence
+
+import numpy as np
+
+from .chunk_store import MappedJSON, MappedStrings, write_json, write_strings
+
+INDEX_FORMAT_VERSION = 4
+
+# BM25Okapi defaults (rank-bm25)
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+# Scores equal to this many decimals are treated as ties
+SCORE_DECIMALS = 9
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into BM25 terms (same as BM25Retriever's default)."""
+    return text.split()
+
+
+class BM25Index:
+    """Postings-based BM25 index over a list of text chunks."""
+
+    def __init__(
+        self,
+        terms: list[str],
+        term_offsets: np.ndarray,
+        post_docs: np.ndarray,
+        post_tfs: np.ndarray,
+        doc_lens: np.ndarray,
+        texts: Sequence[str],
+        metadatas: Sequence[dict[str, Any]],
+        sources: Sequence[str],
+        files: dict[str, dict[str, Any]] | None = None,
+        min_text_chars: int | None = None,
+    ) -> None:
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.post_docs = post_docs
+        self.post_tfs = post_tfs
+        self.doc_lens = doc_lens
+        self.texts = texts
+        self.metadatas = metadatas
+        self.sources = sources
+        # Source file records (size, mtime, hash) used for incremental updates
+        self.files = files if files is not None else {}
+        # Length of the shortest chunk, used to bound result counts by a character budget
+        if min_text_chars is None:
+            min_text_chars = min((len(text) for text in texts), default=0)
+        self.min_text_chars = min_text_chars
+        # Saved generation this index was loaded from or written to
+        self.generation: str | None = None
+        self._compute_statistics()
+
+    @classmethod
+    def build(
+        cls,
+        texts: Iterable[str],
+        metadatas: Iterable[dict[str, Any]],
+        sources: Iterable[str],
+        files: dict[str, dict[str, Any]] | None = None,
+    ) -> "BM25Index":
+        """Tokenize chunks and build postings lists.
+
+        Term ids are assigned in order of first appearance, matching the
+        order rank-bm25 accumulates its IDF statistics.
+        """
+        texts = list(texts)
+        metadatas = [dict(m) for m in metadatas]
+
+        terms: list[str] = []
+        term_ids: dict[str, int] = {}
+        post_terms, post_docs, post_tfs, doc_lens = _tokenize_postings(texts, terms, term_ids, 0)
+        order = np.argsort(post_terms, kind="stable")
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum(np.bincount(post_terms, minlength=len(terms)))
+
+        return cls(
+            terms, term_offsets, post_docs[order], post_tfs[order], doc_lens,
+            texts, metadatas, list(sources), files,
+        )
+
+    def update(
+        self,
+        removed_sources: Iterable[str],
+        texts: Iterable[str],
+        metadatas: Iterable[dict[str, Any]],
+        sources: Iterable[str],
+    ) -> None:
+        """Drop all chunks of removed sources and append new chunks in place.
+
+        Postings of kept chunks are filtered and renumbered, postings for the
+        new chunks are merged in, and terms no longer present anywhere are
+        pruned so IDF statistics match a fresh build of the same corpus.
+        """
+        removed = set(removed_sources)
+        texts = list(texts)
+
+        # Drop removed chunks and renumber the survivors
+        keep_docs = np.array([source not in removed for source in self.sources], dtype=bool)
+        new_doc_ids = np.cumsum(keep_docs, dtype=np.int64) - 1
+        num_kept = int(keep_docs.sum())
+
+        df = np.diff(self.term_offsets)
+        old_terms = np.repeat(np.arange(len(self.terms), dtype=np.int64), df)
+        keep_postings = keep_docs[self.post_docs]
+        old_terms = old_terms[keep_postings]
+        old_docs = new_doc_ids[self.post_docs[keep_postings]].astype(np.int32)
+        old_tfs = self.post_tfs[keep_postings]
+
+        # Tokenize new chunks, extending the vocabulary
+        terms = list(self.terms)
+        term_ids = dict(self.term_ids)
+        new_terms, new_docs, new_tfs, new_lens = _tokenize_postings(texts, terms, term_ids, num_kept)
+
+        # Merge: a stable sort by term keeps each postings list in doc order
+        all_terms = np.concatenate([old_terms, new_terms])
+        order = np.argsort(all_terms, kind="stable")
+        all_terms = all_terms[order]
+        post_docs = np.concatenate([old_docs, new_docs])[order]
+        post_tfs = np.concatenate([old_tfs, new_tfs])[order]
+
+        # Prune terms with no remaining postings
+        counts = np.bincount(all_terms, minlength=len(terms))
+        live = counts > 0
+        self.terms = [term for term, alive in zip(terms, live) if alive]
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.term_offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        self.term_offsets[1:] = np.cumsum(counts[live])
+        self.post_docs = post_docs
+        self.post_tfs = post_tfs
+
+        self.doc_lens = np.concatenate([self.doc_lens[keep_docs], new_lens])
+        self.texts = [text for text, keep in zip(self.texts, keep_docs) if keep] + texts
+        self.metadatas = [m for m, keep in zip(self.metadatas, keep_docs) if keep] + [dict(m) for m in metadatas]
+        self.sources = [s for s, keep in zip(self.sources, keep_docs) if keep] + list(sources)
+        self.min_text_chars = min((len(text) for text in self.texts), default=0)
+        self.generation = None
+        self._compute_statistics()
+
+    def _compute_statistics(self) -> None:
+        """Derive IDF and length normalization from postings and doc lengths."""
+        num_docs = len(self.doc_lens)
+        self.num_docs = num_docs
+        self.avgdl = float(self.doc_lens.sum()) / num_docs if num_docs else 0.0
+
+        df = np.diff(self.term_offsets).astype(np.float64)
+        idf = np.log(num_docs - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            # BM25Okapi floors negative IDFs at a fraction of the average IDF
+            eps = EPSILON * (idf.sum() / len(idf))
+            idf[idf < 0] = eps
+        self.idf = idf
+
+        if self.avgdl:
+            self.norms = K1 * (1 - B + B * self.doc_lens / self.avgdl)
+        else:
+            self.norms = np.full(num_docs, K1 * (1 - B))
+
+        # Per-term score bounds for MaxScore, filled lazily by _term_bounds
+        self._bounds: dict[int, tuple[float, float]] = {}
+        self._matrix: BM25Matrix | None = None
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def matrix(self) -> "BM25Matrix":
+        """Vectorized scorer over this index (built on first use)."""
+        if self._matrix is None:
+            self._matrix = BM25Matrix(self)
+        return self._matrix
+
+    def _term_scores(self, term_id: int, positions: slice | np.ndarray) -> np.ndarray:
+        """BM25 contributions of a term for the given postings positions."""
+        lo = self.term_offsets[term_id]
+        hi = self.term_offsets[term_id + 1]
+        docs = self.post_docs[lo:hi][positions]
+        tfs = self.post_tfs[lo:hi][positions]
+        return self.idf[term_id] * (tfs * (K1 + 1) / (tfs + self.norms[docs]))
+
+    def _term_bounds(self, term_id: int) -> tuple[float, float]:
+        """Smallest and largest contribution a term makes to any document."""
+        bounds = self._bounds.get(term_id)
+        if bounds is None:
+            scores = self._term_scores(term_id, slice(None))
+            bounds = self._bounds[term_id] = (float(scores.min()), float(scores.max()))
+        return bounds
+
+    def search(self, query: str, k: int, min_score: float | None = None) -> list[tuple[int, float]]:
+        """Return up to k (doc_id, score) pairs for documents matching the query.
+
+        Documents scoring below min_score are never returned; the cutoff
+        also serves as the initial pruning threshold.
+
+        Uses MaxScore pruning: query terms are processed from the highest to
+        the lowest score upper bound. Once the bounds of the remaining terms
+        cannot lift an unseen document into the top k, their postings lists
+        are only probed (binary search) for the current candidates, and
+        candidates that can no longer make the cut are dropped.
+
+        Results are ordered by descending score, ties broken by document order.
+        """
+        if k <= 0:
+            return []
+
+        counts: dict[int, int] = {}
+        for token in tokenize(query):
+            term_id = self.term_ids.get(token)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+
+        # (term_id, occurrences in query, lowest contribution, highest contribution)
+        query_terms = []
+        for term_id, count in counts.items():
+            low, high = self._term_bounds(term_id)
+            query_terms.append((term_id, count, count * low, count * high))
+        query_terms.sort(key=lambda t: t[3], reverse=True)
+
+        # Bounds on what the unprocessed terms can still add to a document
+        remaining_high = sum(max(t[3], 0.0) for t in query_terms)
+        remaining_low = sum(min(t[2], 0.0) for t in query_terms)
+
+        docs = np.empty(0, dtype=np.int32)
+        scores = np.empty(0, dtype=np.float64)
+        floor = -np.inf if min_score is None else min_score
+        for term_id, count, low, high in query_terms:
+            threshold = floor
+            if len(scores) >= k:
+                lower_bounds = scores + remaining_low
+                threshold = max(floor, np.partition(lower_bounds, len(lower_bounds) - k)[len(lower_bounds) - k])
+
+            lo, hi = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            term_docs = self.post_docs[lo:hi]
+
+            if remaining_high < threshold:
+                # Non-essential term: only candidates can still reach the top k
+                alive = scores + remaining_high >= threshold
+                docs, scores = docs[alive], scores[alive]
+                positions = np.minimum(np.searchsorted(term_docs, docs), len(term_docs) - 1)
+                hits = term_docs[positions] == docs
+                scores[hits] += count * self._term_scores(term_id, positions[hits])
+            else:
+                # Essential term: its documents join the candidate set
+                merged, inverse = np.unique(np.concatenate([docs, term_docs]), return_inverse=True)
+                weights = np.concatenate([scores, count * self._term_scores(term_id, slice(None))])
+                docs, scores = merged, np.bincount(inverse, weights=weights, minlength=len(merged))
+
+            remaining_high -= max(high, 0.0)
+            remaining_low -= min(low, 0.0)
+
+        if min_score is not None:
+            keep = scores >= min_score
+            docs, scores = docs[keep], scores[keep]
+        return _top_k(docs, scores, k)
+
+    def save(self, path: str | Path, key: dict[str, Any]) -> None:
+        """Write the index to a new generation directory under path.
+
+        Data files go to a fresh ``gen-*`` directory and the manifest that
+        points at it is replaced last, atomically. Processes that mapped an
+        older generation keep reading it undisturbed; older generations are
+        then deleted on a best-effort basis.
+        """
+        path = Path(path)
+        generation = f"gen-{time.time_ns()}"
+        data_dir = path / generation
+        data_dir.mkdir(parents=True)
+
+        for name in ("term_offsets", "post_docs", "post_tfs", "doc_lens"):
+            np.save(data_dir / f"{name}.npy", getattr(self, name))
+        write_strings(data_dir, "texts", self.texts)
+        write_json(data_dir, "metadata", self.metadatas)
+        write_strings(data_dir, "sources", self.sources)
+        (data_dir / "terms.json").write_text(json.dumps(self.terms, ensure_ascii=False), encoding="utf-8")
+        (data_dir / "files.json").write_text(json.dumps(self.files, ensure_ascii=False), encoding="utf-8")
+
+        manifest = {
+            "version": INDEX_FORMAT_VERSION,
+            "key": key,
+            "generation": generation,
+            "num_docs": self.num_docs,
+            "num_terms": len(self.terms),
+            "min_text_chars": self.min_text_chars,
+        }
+        tmp_path = path / f"manifest.json.{generation}.tmp"
+        tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        tmp_path.replace(path / "manifest.json")
+        self.generation = generation
+
+        for old in path.glob("gen-*"):
+            if old.name != generation:
+                shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str | Path, key: dict[str, Any]) -> "BM25Index | None":
+        """Map an index saved under the same key. Returns None on a miss.
+
+        Postings, document lengths, chunk texts and metadata stay on disk
+        and are paged in on demand.
+        """
+        path = Path(path)
+        try:
+            manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != INDEX_FORMAT_VERSION or manifest.get("key") != key:
+            return None
+
+        data_dir = path / manifest["generation"]
+        try:
+            arrays = {
+                name: np.load(data_dir / f"{name}.npy", mmap_mode="r")
+                for name in ("term_offsets", "post_docs", "post_tfs", "doc_lens")
+            }
+            texts = MappedStrings(data_dir, "texts")
+            metadatas = MappedJSON(data_dir, "metadata")
+            sources = MappedStrings(data_dir, "sources")
+            terms = json.loads((data_dir / "terms.json").read_text(encoding="utf-8"))
+            files = json.loads((data_dir / "files.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            # Generation replaced and deleted while we were loading it
+            return None
+
+        index = cls(
+            terms, arrays["term_offsets"], arrays["post_docs"], arrays["post_tfs"], arrays["doc_lens"],
+            texts, metadatas, sources, files, manifest["min_text_chars"],
+        )
+        index.generation = manifest["generation"]
+        return index
+
+
+class BM25Matrix:
+    """BM25 as a sparse term-document matrix product.
+
+    The index's postings already form a CSR matrix with one row per term
+    (``term_offsets`` = indptr, ``post_docs`` = column indices). This class
+    stores the fully weighted BM25 contribution of every entry, so scoring
+    a query is a gather of its term rows followed by a scatter-add into a
+    dense score vector, and a batch of queries is one sparse-dense product.
+    """
+
+    def __init__(self, index: BM25Index) -> None:
+        self.index = index
+        term_ids = np.repeat(np.arange(len(index.terms)), np.diff(index.term_offsets))
+        tfs = index.post_tfs
+        self.weights = index.idf[term_ids] * (tfs * (K1 + 1) / (tfs + index.norms[index.post_docs]))
+
+    def search(self, query: str, k: int, min_score: float | None = None) -> list[tuple[int, float]]:
+        """Return up to k (doc_id, score) pairs, same contract as BM25Index.search."""
+        return self.search_batch([query], k, min_score)[0]
+
+    def search_batch(
+        self, queries: list[str], k: int, min_score: float | None = None
+    ) -> list[list[tuple[int, float]]]:
+        """Score several queries at once.
+
+        Builds the (queries x terms) count matrix implicitly and multiplies
+        it with the weighted term-document matrix in a single scatter-add.
+        """
+        index = self.index
+        num_docs = index.num_docs
+        rows, docs, weights = [], [], []
+        for row, query in enumerate(queries):
+            counts: dict[int, int] = {}
+            for token in tokenize(query):
+                term_id = index.term_ids.get(token)
+                if term_id is not None:
+                    counts[term_id] = counts.get(term_id, 0) + 1
+            for term_id, count in counts.items():
+                lo, hi = index.term_offsets[term_id], index.term_offsets[term_id + 1]
+                docs.append(index.post_docs[lo:hi])
+                weights.append(count * self.weights[lo:hi])
+                rows.append(np.full(hi - lo, row, dtype=np.int64))
+
+        if not docs or k <= 0:
+            return [[] for _ in queries]
+
+        cells = np.concatenate(rows) * num_docs + np.concatenate(docs)
+        size = len(queries) * num_docs
+        scores = np.bincount(cells, weights=np.concatenate(weights), minlength=size)
+        matched = np.bincount(cells, minlength=size) > 0
+
+        results = []
+        for row in range(len(queries)):
+            row_scores = scores[row * num_docs:(row + 1) * num_docs]
+            candidates = np.flatnonzero(matched[row * num_docs:(row + 1) * num_docs])
+            if min_score is not None:
+                candidates = candidates[row_scores[candidates] >= min_score]
+            if len(candidates) > k:
+                # Keep everything tied with the k-th best so _top_k can order ties
+                rounded = np.round(row_scores[candidates], SCORE_DECIMALS)
+                kth = np.partition(rounded, len(rounded) - k)[len(rounded) - k]
+                candidates = candidates[rounded >= kth]
+            results.append(_top_k(candidates, row_scores[candidates], k))
+        return results
+
+
+def _top_k(docs: np.ndarray, scores: np.ndarray, k: int) -> list[tuple[int, float]]:
+    """Best k (doc_id, score) pairs, ties broken by document order.
+
+    Scores are compared after rounding so that floating-point summation
+    order never decides between documents with equal BM25 scores.
+    """
+    order = np.lexsort((docs, -np.round(scores, SCORE_DECIMALS)))[:k]
+    return [(int(docs[i]), float(scores[i])) for i in order]
+
+
+def _tokenize_postings(
+    texts: list[str],
+    terms: list[str],
+    term_ids: dict[str, int],
+    first_doc_id: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Tokenize texts into flat (term, doc, tf) posting arrays in doc order.
+
+    New terms are appended to ``terms``/``term_ids``. Returns the posting
+    arrays plus the document lengths.
+    """
+    post_terms: list[int] = []
+    post_docs: list[int] = []
+    post_tfs: list[int] = []
+    doc_lens = np.zeros(len(texts), dtype=np.int32)
+
+    for offset, text in enumerate(texts):
+        tokens = tokenize(text)
+        doc_lens[offset] = len(tokens)
+        frequencies: dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, tf in frequencies.items():
+            term_id = term_ids.get(token)
+            if term_id is None:
+                term_id = term_ids[token] = len(terms)
+                terms.append(token)
+            post_terms.append(term_id)
+            post_docs.append(first_doc_id + offset)
+            post_tfs.append(tf)
+
+    return (
+        np.array(post_terms, dtype=np.int64),
+        np.array(post_docs, dtype=np.int32),
+        np.array(post_tfs, dtype=np.int32),
+        doc_lens,
+    )
@@ -1,11 +1,12 @@
+import json
 import re
 import uuid
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
-from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 
 from .config import Config
 
@@ -224,6 +225,30 @@ class MockChatModel(BaseChatModel):
         )
 
 
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        """Stream the mock response word by word, like a real model streams tokens."""
+        message = self._generate(messages, stop, **kwargs).generations[0].message
+        if message.tool_calls:
+            tool_call_chunks = [
+                {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                for i, tc in enumerate(message.tool_calls)
+            ]
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=tool_call_chunks))
+            return
+
+        for token in re.findall(r"\s*\S+|\s+$", message.content):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
 def get_llm(cfg: Config) -> BaseChatModel:
     """Get a LangChain chat model based on configuration.
 
@@ -280,3 +305,17 @@ def get_text(response) -> str:
             b.get("text", "") for b in content if isinstance(b, dict)
         ).strip()
     return ""
+
+
+def get_delta_text(chunk) -> str:
+    """Extract the text of a streamed message chunk.
+
+    Unlike get_text, whitespace is kept, since a chunk's leading or
+    trailing space separates it from its neighbours.
+    """
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(b.get("text", "") for b in content if isinstance(b, dict))
+    return ""
@@ -47,6 +47,31 @@ def log_tool_call(
     )
 
 
+def log_tool_cache_hit(
+    run_id: str,
+    tool_name: str,
+    args: dict[str, Any],
+    log_path: str | Path = "logs/runs.jsonl",
+) -> None:
+    """Log a tool call that was answered from the tool result cache.
+
+    Args:
+        run_id: Unique identifier for this run
+        tool_name: Name of the tool being called
+        args: Arguments passed to the tool
+        log_path: Path to the log file
+    """
+    log_event(
+        {
+            "run_id": run_id,
+            "event": "tool_cache_hit",
+            "tool_name": tool_name,
+            "args": args,
+        },
+        log_path,
+    )
+
+
 def log_tool_result(
     run_id: str,
     tool_name: str,
@@ -0,0 +1,230 @@
+"""In-process metrics for tool execution.
+
+Every tool call made by the graph is wrapped with ``instrument_tool``,
+which records its latency, outcome and payload sizes in a
+``MetricsRegistry``. The registry can be read as a dict or rendered in
+the Prometheus text exposition format, for example into a file picked
+up by node_exporter's textfile collector.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+
+from .logging_utils import log_tool_call, log_tool_result
+
+# Upper bounds of the histogram buckets; a final +Inf bucket is implicit
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        pairs = []
+        total = 0
+        for bound, count in zip((*map(_format_number, self.buckets), "+Inf"), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class _ToolStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.args_bytes = Histogram(SIZE_BUCKETS)
+        self.result_bytes = Histogram(SIZE_BUCKETS)
+
+
+class MetricsRegistry:
+    """Thread-safe per-tool counters and histograms."""
+
+    def __init__(self, prefix: str = "ai_in_loop") -> None:
+        self.prefix = prefix
+        self._tools: dict[str, _ToolStats] = {}
+        self._lock = threading.Lock()
+
+    def observe_tool(
+        self,
+        tool_name: str,
+        elapsed_seconds: float,
+        is_error: bool,
+        args_bytes: int,
+        result_bytes: int,
+    ) -> None:
+        """Record one finished tool call."""
+        with self._lock:
+            stats = self._tools.get(tool_name)
+            if stats is None:
+                stats = self._tools[tool_name] = _ToolStats()
+            stats.calls += 1
+            stats.errors += is_error
+            stats.latency.observe(elapsed_seconds)
+            stats.args_bytes.observe(args_bytes)
+            stats.result_bytes.observe(result_bytes)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tools.clear()
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """Per-tool calls, errors, error rate, and mean latency and payload sizes."""
+        with self._lock:
+            return {
+                name: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "error_rate": stats.errors / stats.calls,
+                    "latency_seconds_total": stats.latency.sum,
+                    "latency_seconds_mean": stats.latency.sum / stats.calls,
+                    "args_bytes_mean": stats.args_bytes.sum / stats.calls,
+                    "result_bytes_mean": stats.result_bytes.sum / stats.calls,
+                }
+                for name, stats in sorted(self._tools.items())
+            }
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            tools = sorted(self._tools.items())
+            for metric, kind, help_text, value in (
+                ("tool_calls_total", "counter", "Tool calls, including failed ones.", lambda s: s.calls),
+                ("tool_errors_total", "counter", "Tool calls that raised or returned an error.", lambda s: s.errors),
+            ):
+                lines += [f"# HELP {p}_{metric} {help_text}", f"# TYPE {p}_{metric} {kind}"]
+                lines += [f'{p}_{metric}{{tool="{_escape(name)}"}} {value(stats)}' for name, stats in tools]
+
+            for metric, help_text, attr in (
+                ("tool_latency_seconds", "Wall-clock time of a tool call.", "latency"),
+                ("tool_args_bytes", "Size of the JSON-encoded tool arguments.", "args_bytes"),
+                ("tool_result_bytes", "Size of the UTF-8 encoded tool result.", "result_bytes"),
+            ):
+                lines += [f"# HELP {p}_{metric} {help_text}", f"# TYPE {p}_{metric} histogram"]
+                for name, stats in tools:
+                    histogram: Histogram = getattr(stats, attr)
+                    label = f'tool="{_escape(name)}"'
+                    lines += [
+                        f'{p}_{metric}_bucket{{{label},le="{bound}"}} {count}'
+                        for bound, count in histogram.cumulative()
+                    ]
+                    lines.append(f"{p}_{metric}_sum{{{label}}} {_format_number(histogram.sum)}")
+                    lines.append(f"{p}_{metric}_count{{{label}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str | Path) -> None:
+        """Write the Prometheus dump to path, replacing it atomically.
+
+        Readers such as a textfile collector never see a partial file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(label: str) -> str:
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _payload_bytes(value: Any) -> int:
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, default=repr)
+    return len(value.encode("utf-8"))
+
+
+def instrument_tool(
+    tool: BaseTool,
+    registry: MetricsRegistry,
+    log_path: str | Path = "logs/runs.jsonl",
+) -> BaseTool:
+    """Wrap a tool so every call is timed and counted in registry.
+
+    A call counts as an error if the tool raises or returns a string
+    starting with "Error:". For runs that carry a run_id in their config
+    metadata, each call and its result are also logged with
+    log_tool_call and log_tool_result.
+
+    Args:
+        tool: The tool to wrap
+        registry: Registry the call is recorded in
+        log_path: Where calls and results are logged
+    """
+
+    def started(config: RunnableConfig, kwargs: dict[str, Any]) -> tuple[str | None, float]:
+        run_id = (config.get("metadata") or {}).get("run_id")
+        if run_id:
+            log_tool_call(run_id, tool.name, kwargs, log_path)
+        return run_id, time.perf_counter()
+
+    def finished(
+        run_id: str | None, start: float, kwargs: dict[str, Any], result: Any, exc: Exception | None = None
+    ) -> None:
+        elapsed = time.perf_counter() - start
+        if exc is None:
+            text = result if isinstance(result, str) else str(result)
+            is_error, result_bytes = text.startswith("Error:"), _payload_bytes(text)
+        else:
+            text, is_error, result_bytes = f"{type(exc).__name__}: {exc}", True, 0
+        registry.observe_tool(tool.name, elapsed, is_error, _payload_bytes(kwargs), result_bytes)
+        if run_id:
+            log_tool_result(run_id, tool.name, text, elapsed, is_error, log_path)
+
+    def run(config: RunnableConfig, **kwargs: Any) -> Any:
+        run_id, start = started(config, kwargs)
+        try:
+            result = tool.invoke(kwargs, config)
+        except Exception as e:
+            finished(run_id, start, kwargs, None, e)
+            raise
+        finished(run_id, start, kwargs, result)
+        return result
+
+    async def arun(config: RunnableConfig, **kwargs: Any) -> Any:
+        run_id, start = started(config, kwargs)
+        try:
+            result = await tool.ainvoke(kwargs, config)
+        except Exception as e:
+            finished(run_id, start, kwargs, None, e)
+            raise
+        finished(run_id, start, kwargs, result)
+        return result
+
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        infer_schema=False,
+    )
@@ -1,11 +1,20 @@
 """Document retrieval with BM25 keyword search."""
 
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import hashlib
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Any, Hashable, Iterable, Iterator, Optional
 import sys
+import threading
+import time
 
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.retrievers import BM25Retriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 try:
@@ -15,62 +24,624 @@ except ImportError:
     HAS_PYPDF = False
 
 from .config import Config
+from .dense import DenseIndex, load_embedder, reciprocal_rank_fusion
+from .index import BM25Index
 
-_retriever: Optional[BM25Retriever] = None
+# Candidates taken from each ranking before hybrid fusion
+HYBRID_DEPTH = 50
+
+# Characters read per block when streaming a text file into the chunker
+STREAM_BLOCK_CHARS = 1 << 20
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """Retriever that answers queries from a BM25Index.
+
+    ``backend`` selects the scoring engine: "postings" (MaxScore over the
+    postings lists) or "matrix" (vectorized sparse matrix scoring). With a
+    ``dense`` index, BM25 and vector rankings are fused (hybrid search).
+    Results are limited to ``k`` chunks scoring at least ``min_score``
+    whose combined length fits in ``max_chars``.
+    """
+
+    index: Any
+    k: int = 3
+    min_score: Optional[float] = None
+    max_chars: Optional[int] = None
+    backend: str = "postings"
+    dense: Any = None
+
+    def _engine(self) -> Any:
+        return self.index.matrix() if self.backend == "matrix" else self.index
+
+    def _fetch_k(self, k: int, max_chars: Optional[int]) -> int:
+        """Number of hits worth scoring for k results within max_chars.
+
+        No more than max_chars // (shortest chunk) chunks can fit in the
+        budget, so asking the engine for more only weakens its pruning.
+        """
+        if max_chars and self.index.min_text_chars:
+            return min(k, max(1, max_chars // self.index.min_text_chars))
+        return k
+
+    def _to_documents(self, hits: list[tuple[int, float]], max_chars: Optional[int]) -> list[Document]:
+        """Materialize hits in rank order until the character budget is spent.
+
+        The first chunk is truncated if it alone exceeds the budget; later
+        chunks that do not fit end the list.
+        """
+        documents = []
+        used = 0
+        for doc_id, _ in hits:
+            text = self.index.texts[doc_id]
+            if max_chars:
+                remaining = max_chars - used
+                if len(text) > remaining:
+                    if documents:
+                        break
+                    text = text[:remaining]
+                used += len(text)
+            documents.append(Document(page_content=text, metadata=dict(self.index.metadatas[doc_id])))
+        return documents
+
+    def search(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        max_chars: Optional[int] = None,
+    ) -> list[Document]:
+        """Retrieve documents, overriding the retriever's limits for this call."""
+        return self.search_many([query], k, min_score, max_chars)[0]
+
+    def search_many(
+        self,
+        queries: list[str],
+        k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        max_chars: Optional[int] = None,
+    ) -> list[list[Document]]:
+        """Retrieve documents for several queries in one pass."""
+        k = self.k if k is None else k
+        min_score = self.min_score if min_score is None else min_score
+        max_chars = self.max_chars if max_chars is None else max_chars
+        fetch_k = self._fetch_k(k, max_chars)
+
+        # Hybrid search fuses deeper rankings from both sides
+        depth = max(fetch_k, HYBRID_DEPTH) if self.dense is not None else fetch_k
+
+        engine = self._engine()
+        if hasattr(engine, "search_batch"):
+            batch = engine.search_batch(queries, depth, min_score)
+        else:
+            batch = [engine.search(query, depth, min_score) for query in queries]
+
+        if self.dense is not None:
+            batch = [
+                reciprocal_rank_fusion([lexical, semantic], fetch_k)
+                for lexical, semantic in zip(batch, self.dense.search(queries, depth))
+            ]
+        return [self._to_documents(hits, max_chars) for hits in batch]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return self.search(query)
+
+
+class QueryCache:
+    """Thread-safe LRU cache of search results with an optional TTL.
+
+    Keys include the corpus version, so results computed against an older
+    index are never returned after it changes.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def configure(self, maxsize: int, ttl: float | None) -> None:
+        """Change limits, evicting entries that no longer fit."""
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._evict()
+
+    def get(self, key: Hashable) -> Any | None:
+        """Return the cached value, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_retriever: Optional[BM25IndexRetriever] = None
 _is_initialized: bool = False
+# Concurrent tool calls may all reach get_retriever before the index is loaded
+_init_lock = threading.Lock()
+
+# Bumped whenever the searchable corpus changes; part of every cache key
+_corpus_version: int = 0
+_query_cache = QueryCache()
+
+
+def _discover_files(resources_dir: Path) -> list[Path]:
+    """List loadable documents, skipping hidden files and directories."""
+    patterns = ["**/*.txt"]
+    if HAS_PYPDF:
+        patterns.append("**/*.pdf")
+
+    files = []
+    for pattern in patterns:
+        for path in resources_dir.glob(pattern):
+            relative = path.relative_to(resources_dir)
+            if path.is_file() and not any(part.startswith(".") for part in relative.parts):
+                files.append(path)
+    return sorted(files)
+
+
+def _hash_file(path: Path) -> str:
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _diff_files(
+    resources_dir: Path, files: list[Path], records: dict[str, dict[str, Any]]
+) -> tuple[list[Path], list[str], dict[str, dict[str, Any]]]:
+    """Compare files on disk with the records stored in the index.
+
+    Files whose size and mtime match their record are trusted without
+    reading them; otherwise the content hash decides whether they changed.
+
+    Returns:
+        (files to (re)index, sources to drop from the index, new records)
+    """
+    changed = []
+    current: dict[str, dict[str, Any]] = {}
+    for path in files:
+        name = path.relative_to(resources_dir).as_posix()
+        stat = path.stat()
+        record = records.get(name)
+        if record and record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+            current[name] = record
+            continue
+        content_hash = _hash_file(path)
+        current[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": content_hash}
+        if record is None or record["sha256"] != content_hash:
+            changed.append(path)
+
+    changed_names = {path.relative_to(resources_dir).as_posix() for path in changed}
+    removed = [name for name in records if name not in current or name in changed_names]
+    return changed, removed, current
+
+
+def _index_cache_dir(cfg: Config) -> Path:
+    """Directory holding the persisted index for this chunking setup."""
+    base = Path(cfg.index_cache_dir) if cfg.index_cache_dir else Path(cfg.resources_dir) / ".index"
+    return base / f"bm25-{cfg.chunk_size}-{cfg.chunk_overlap}"
+
+
+def _load_file(path: Path) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Read a .txt or .pdf file as a stream of (text block, metadata).
+
+    Text files are read in STREAM_BLOCK_CHARS blocks; PDFs yield one block
+    per page. Consecutive blocks with equal metadata belong to the same
+    document.
+    """
+    if path.suffix == ".pdf":
+        for page in PyPDFLoader(str(path)).lazy_load():
+            yield page.page_content, page.metadata
+        return
+    metadata = {"source": str(path)}
+    with path.open() as f:
+        for block in iter(lambda: f.read(STREAM_BLOCK_CHARS), ""):
+            yield block, metadata
+
+
+def _split_stream(
+    blocks: Iterable[tuple[str, dict[str, Any]]], splitter: RecursiveCharacterTextSplitter
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Chunk a stream of text blocks without joining them into one string.
+
+    After each block, every chunk but the last is emitted. The last chunk
+    may still grow, so the text from its start is carried over and split
+    again together with the next block. Pending text therefore never
+    exceeds one block plus one chunk.
+    """
+    pending, pending_metadata = "", None
+    for text, metadata in blocks:
+        if metadata != pending_metadata:
+            for chunk in splitter.split_text(pending):
+                yield chunk, dict(pending_metadata)
+            pending, pending_metadata = "", metadata
+        pending += text
+
+        chunks = splitter.split_text(pending)
+        if len(chunks) < 2:
+            continue
+        for chunk in chunks[:-1]:
+            yield chunk, dict(metadata)
+        # Chunks are whitespace-stripped substrings; the last one ends the text
+        tail_start = pending.rfind(chunks[-1])
+        if tail_start < 0:
+            yield chunks[-1], dict(metadata)
+            tail_start = len(pending)
+        pending = pending[tail_start:]
+
+    if pending_metadata is not None:
+        for chunk in splitter.split_text(pending):
+            yield chunk, dict(pending_metadata)
+
+
+def _iter_chunks(path: Path, chunk_size: int, chunk_overlap: int) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Stream (text, metadata) chunks of one file."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    return _split_stream(_load_file(path), splitter)
+
+
+def _chunk_file(
+    path: Path, chunk_size: int, chunk_overlap: int
+) -> tuple[list[tuple[str, dict[str, Any]]], str | None]:
+    """Load and chunk one file. Runs in ingest worker processes.
+
+    Returns:
+        ((text, metadata) per chunk, error message or None)
+    """
+    try:
+        return list(_iter_chunks(path, chunk_size, chunk_overlap)), None
+    except Exception as e:
+        return [], str(e)
+
+
+def _ingest_workers(cfg: Config, num_files: int) -> int:
+    """Number of worker processes to use for num_files files."""
+    workers = cfg.ingest_workers or os.cpu_count() or 1
+    return max(1, min(workers, num_files))
+
+
+def _chunk_files(
+    cfg: Config, files: list[Path]
+) -> tuple[list[str], list[dict[str, Any]], list[str], set[str]]:
+    """Load and chunk files, in parallel when ingest_workers allows.
 
+    Chunks are returned in file order regardless of which worker finishes
+    first, so the index is identical to a serial build. Serial ingest
+    streams each file straight into the chunk lists; workers stream too,
+    but send back one file's chunks at a time.
 
-def get_retriever(cfg: Config) -> Optional[BM25Retriever]:
-    """Get or create BM25 retriever (singleton). Returns None if no docs."""
+    Returns:
+        (chunk texts, chunk metadata, chunk source names, names that failed to load)
+    """
+    resources_dir = Path(cfg.resources_dir)
+    texts, metadatas, sources = [], [], []
+    failed = set()
+
+    def fail(path: Path, error: Any) -> None:
+        print(f"Warning: Error loading '{path}': {error}", file=sys.stderr)
+        failed.add(path.relative_to(resources_dir).as_posix())
+
+    workers = _ingest_workers(cfg, len(files))
+    if workers > 1:
+        sizes = [cfg.chunk_size] * len(files)
+        overlaps = [cfg.chunk_overlap] * len(files)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, (chunks, error) in zip(files, executor.map(_chunk_file, files, sizes, overlaps)):
+                if error is not None:
+                    fail(path, error)
+                    continue
+                name = path.relative_to(resources_dir).as_posix()
+                for text, metadata in chunks:
+                    texts.append(text)
+                    metadatas.append(metadata)
+                    sources.append(name)
+        return texts, metadatas, sources, failed
+
+    for path in files:
+        name = path.relative_to(resources_dir).as_posix()
+        start = len(texts)
+        try:
+            for text, metadata in _iter_chunks(path, cfg.chunk_size, cfg.chunk_overlap):
+                texts.append(text)
+                metadatas.append(metadata)
+                sources.append(name)
+        except Exception as e:
+            # Drop the chunks emitted before the file failed part-way
+            del texts[start:], metadatas[start:], sources[start:]
+            fail(path, e)
+    return texts, metadatas, sources, failed
+
+
+def _sync_index(cfg: Config, index: BM25Index, files: list[Path]) -> bool:
+    """Re-index added or modified files and drop deleted ones.
+
+    Returns True if the index or its file records changed.
+    """
+    resources_dir = Path(cfg.resources_dir)
+    changed, removed, records = _diff_files(resources_dir, files, index.files)
+    if not changed and not removed:
+        if records == index.files:
+            return False
+        index.files = records  # touched files with unchanged content
+        return True
+
+    texts, metadatas, sources, failed = _chunk_files(cfg, changed)
+    index.update(removed, texts, metadatas, sources)
+    for name in failed:
+        records.pop(name, None)  # retry on the next sync
+    index.files = records
+    print(
+        f"Indexed {len(texts)} chunks from {len(changed) - len(failed)} changed files "
+        f"({len(index)} chunks total)",
+        file=sys.stderr,
+    )
+    return True
+
+
+def _save_index(index: BM25Index, cache_dir: Path, cache_key: dict[str, Any]) -> BM25Index:
+    """Persist the index and return it re-opened from disk.
+
+    The re-opened index is memory-mapped, so the in-memory copy built here
+    can be freed and this process shares pages with other workers.
+    """
+    try:
+        index.save(cache_dir, cache_key)
+    except OSError as e:
+        print(f"Warning: Could not write index cache '{cache_dir}': {e}", file=sys.stderr)
+        return index
+    return BM25Index.load(cache_dir, cache_key) or index
+
+
+def _cache_key(cfg: Config) -> dict[str, Any]:
+    return {
+        "resources_dir": str(Path(cfg.resources_dir).resolve()),
+        "chunk_size": cfg.chunk_size,
+        "chunk_overlap": cfg.chunk_overlap,
+    }
+
+
+def _dense_index(cfg: Config, index: BM25Index, previous: Optional[DenseIndex] = None) -> DenseIndex:
+    """Load or build the vector index matching this BM25 index.
+
+    The dense index is stored next to the BM25 index and keyed by its
+    generation. When they are out of step it is rebuilt, reusing the
+    vectors of unchanged chunks from previous (or the last saved copy).
+    """
+    embedder = load_embedder(cfg.dense_embedder)
+    path = _index_cache_dir(cfg) / f"dense-{embedder.name}"
+    key = {"embedder": embedder.name, "generation": index.generation}
+
+    dense = DenseIndex.load(path, embedder, key) if index.generation else None
+    if dense is not None:
+        return dense
+
+    if previous is None:
+        previous = DenseIndex.load(path, embedder, None)
+    dense = DenseIndex.build(embedder, index.texts, previous)
+    if index.generation:
+        try:
+            dense.save(path, key)
+        except OSError as e:
+            print(f"Warning: Could not write dense index '{path}': {e}", file=sys.stderr)
+    return dense
+
+
+def get_retriever(cfg: Config) -> Optional[BM25IndexRetriever]:
+    """Get or create BM25 retriever (singleton). Returns None if no docs.
+
+    The index is persisted under the cache directory. On startup only files
+    added, modified or deleted since it was saved are re-indexed.
+    """
     global _retriever, _is_initialized
 
     if _is_initialized:
         return _retriever
 
-    _is_initialized = True
+    with _init_lock:
+        if not _is_initialized:
+            _retriever = _load_retriever(cfg)
+            _is_initialized = True
+    return _retriever
+
+
+def _load_retriever(cfg: Config) -> Optional[BM25IndexRetriever]:
     resources_dir = Path(cfg.resources_dir)
+    _query_cache.configure(cfg.query_cache_size, cfg.query_cache_ttl)
 
     if not resources_dir.exists():
         print(f"Info: '{resources_dir}' not found. Document search disabled.", file=sys.stderr)
         return None
 
-    documents = []
+    files = _discover_files(resources_dir)
+    if not files:
+        print(f"Info: No documents in '{resources_dir}'. Search disabled.", file=sys.stderr)
+        return None
 
-    # Load .txt files
-    txt_loader = DirectoryLoader(str(resources_dir), glob="**/*.txt", loader_cls=TextLoader)
-    try:
-        documents.extend(txt_loader.load())
-    except Exception as e:
-        print(f"Warning: Error loading .txt files: {e}", file=sys.stderr)
+    cache_dir = _index_cache_dir(cfg)
+    cache_key = _cache_key(cfg)
+    index = BM25Index.load(cache_dir, cache_key)
+    if index is None:
+        index = BM25Index.build([], [], [])
+    elif index.files:
+        print(f"Loaded {len(index)} chunks from index cache '{cache_dir}'", file=sys.stderr)
 
-    # Load .pdf files (if pypdf available)
-    if HAS_PYPDF:
-        pdf_loader = DirectoryLoader(str(resources_dir), glob="**/*.pdf", loader_cls=PyPDFLoader)
-        try:
-            documents.extend(pdf_loader.load())
-        except Exception as e:
-            print(f"Warning: Error loading .pdf files: {e}", file=sys.stderr)
+    if _sync_index(cfg, index, files):
+        index = _save_index(index, cache_dir, cache_key)
 
-    if not documents:
+    if not len(index):
         print(f"Info: No documents in '{resources_dir}'. Search disabled.", file=sys.stderr)
         return None
 
-    # Chunk documents
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=cfg.chunk_size,
-        chunk_overlap=cfg.chunk_overlap,
+    return BM25IndexRetriever(
+        index=index,
+        k=cfg.search_k,
+        min_score=cfg.search_min_score,
+        max_chars=cfg.search_max_chars,
+        backend=cfg.search_backend,
+        dense=_dense_index(cfg, index) if cfg.dense_embedder else None,
     )
-    chunks = splitter.split_documents(documents)
 
-    # Create BM25 retriever
-    _retriever = BM25Retriever.from_documents(chunks, k=3)
-    print(f"Loaded {len(chunks)} chunks from {len(documents)} documents", file=sys.stderr)
 
+def refresh_retriever(cfg: Config) -> Optional[BM25IndexRetriever]:
+    """Pick up added, modified and deleted documents without a full rebuild.
+
+    The update is applied to a copy of the index which then replaces the
+    live one, so concurrent searches never see a half-updated index.
+    """
+    global _retriever, _corpus_version
+
+    if _retriever is None:
+        reset_retriever()
+        return get_retriever(cfg)
+
+    index = copy.copy(_retriever.index)
+    files = _discover_files(Path(cfg.resources_dir))
+    if _sync_index(cfg, index, files):
+        index = _save_index(index, _index_cache_dir(cfg), _cache_key(cfg))
+        _retriever.index = index
+        if _retriever.dense is not None:
+            _retriever.dense = _dense_index(cfg, index, _retriever.dense)
+        _corpus_version += 1
+        _query_cache.clear()
+
+    if not len(index):
+        _retriever = None
     return _retriever
 
 
+def search_documents(
+    cfg: Config,
+    query: str,
+    k: Optional[int] = None,
+    min_score: Optional[float] = None,
+    max_chars: Optional[int] = None,
+) -> Optional[list[Document]]:
+    """Search the corpus, answering repeated queries from the query cache.
+
+    k, min_score and max_chars override the configured limits for this
+    call. Queries are normalized by collapsing whitespace, which cannot
+    change their BM25 terms. Returns None if no documents are available.
+    """
+    retriever = get_retriever(cfg)
+    if retriever is None:
+        return None
+
+    limits = _search_limits(retriever, k, min_score, max_chars)
+    key = _query_key(retriever, query, limits)
+    results = _query_cache.get(key)
+    if results is None:
+        results = retriever.search(query, *limits)
+        _query_cache.put(key, results)
+    return list(results)
+
+
+async def asearch_documents(
+    cfg: Config,
+    query: str,
+    k: Optional[int] = None,
+    min_score: Optional[float] = None,
+    max_chars: Optional[int] = None,
+) -> Optional[list[Document]]:
+    """Async search_documents for use on an event loop.
+
+    Cache hits are answered on the loop. Loading the index and searching
+    are CPU-bound, so they run in a worker thread and do not stall other
+    conversations sharing the loop.
+    """
+    if not _is_initialized:
+        await asyncio.to_thread(get_retriever, cfg)
+    retriever = get_retriever(cfg)
+    if retriever is None:
+        return None
+
+    limits = _search_limits(retriever, k, min_score, max_chars)
+    key = _query_key(retriever, query, limits)
+    results = _query_cache.get(key)
+    if results is None:
+        results = await asyncio.to_thread(retriever.search, query, *limits)
+        _query_cache.put(key, results)
+    return list(results)
+
+
+def _search_limits(
+    retriever: BM25IndexRetriever,
+    k: Optional[int],
+    min_score: Optional[float],
+    max_chars: Optional[int],
+) -> tuple[int, Optional[float], Optional[int]]:
+    """Per-call limits, falling back to the retriever's configured ones."""
+    return (
+        retriever.k if k is None else k,
+        retriever.min_score if min_score is None else min_score,
+        retriever.max_chars if max_chars is None else max_chars,
+    )
+
+
+def _query_key(retriever: BM25IndexRetriever, query: str, limits: tuple) -> tuple:
+    return (_corpus_version, retriever.backend, *limits, " ".join(query.split()))
+
+
+def corpus_version() -> int:
+    """Number that changes whenever the searchable corpus changes."""
+    return _corpus_version
+
+
+def query_cache_stats() -> dict[str, int]:
+    """Hit, miss, eviction and expiration counters of the query cache."""
+    return _query_cache.stats()
+
+
 def reset_retriever() -> None:
-    """Reset singleton (for testing)."""
-    global _retriever, _is_initialized
+    """Reset singleton and drop cached search results."""
+    global _retriever, _is_initialized, _corpus_version
     _retriever = None
     _is_initialized = False
+    _corpus_version += 1
+    _query_cache.clear()
@@ -0,0 +1,163 @@
+"""Bounded pool of warm worker processes for CPU-heavy tool calls.
+
+A job is a picklable module-level function plus its arguments. Each job
+runs in a worker process, so it cannot hold the main process's GIL, and
+a job that overruns its timeout is stopped by killing its worker, which
+is then replaced. Workers are also recycled after a fixed number of jobs
+to bound memory growth.
+"""
+
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+from multiprocessing.connection import Connection
+import pickle
+import queue
+import signal
+import threading
+from typing import Any, Callable
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when a worker process dies while running a job."""
+
+
+def _worker_main(conn: Connection) -> None:
+    """Run jobs received over conn until the pipe is closed."""
+    # Ctrl-C is handled by the main process, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            func, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+def _context() -> multiprocessing.context.BaseContext:
+    # fork is unsafe from a threaded server; forkserver forks from a clean process
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    """One worker process and the pipe used to talk to it."""
+
+    def __init__(self, ctx: multiprocessing.context.BaseContext) -> None:
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def kill(self) -> None:
+        self.conn.close()
+        self.process.kill()
+        self.process.join()
+
+    def close(self) -> None:
+        self.conn.close()  # the worker exits on EOF
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class WorkerPool:
+    """Fixed-size pool of warm worker processes with per-job timeouts.
+
+    Args:
+        workers: Number of worker processes, all started up front
+        timeout: Seconds a job may run before its worker is killed
+        max_jobs_per_worker: Jobs after which a worker is replaced
+        preload: Modules imported once by the fork server, so new workers start warm
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        timeout: float,
+        max_jobs_per_worker: int = 1000,
+        preload: tuple[str, ...] = (),
+    ) -> None:
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._ctx = _context()
+        if preload and self._ctx.get_start_method() == "forkserver":
+            self._ctx.set_forkserver_preload(list(preload))
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._all: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(workers):
+            self._add_worker()
+        atexit.register(self.close)
+
+    def _add_worker(self) -> None:
+        worker = _Worker(self._ctx)
+        with self._lock:
+            self._all.add(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker: _Worker, killed: bool) -> None:
+        with self._lock:
+            self._all.discard(worker)
+        worker.kill() if killed else worker.close()
+        if not self._closed:
+            self._add_worker()
+
+    def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run func(*args) in a worker and return its result.
+
+        Waiting for a free worker and running the job each get the full
+        timeout. Exceptions raised by func are re-raised here.
+
+        Raises:
+            TimeoutError: If no worker frees up, or the job runs too long
+            WorkerCrashedError: If the worker died during the job
+        """
+        if self._closed:
+            raise RuntimeError("Worker pool is closed")
+        payload = pickle.dumps((func, args))  # fail before taking a worker
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("All workers are busy") from None
+
+        try:
+            worker.conn.send_bytes(payload)
+            finished = worker.conn.poll(self.timeout)
+            if finished:
+                ok, value = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            self._retire(worker, killed=True)
+            raise WorkerCrashedError(f"Worker process died: {e}") from e
+        if not finished:
+            self._retire(worker, killed=True)
+            raise TimeoutError(f"Job exceeded {self.timeout:g}s")
+
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs_per_worker:
+            self._retire(worker, killed=False)
+        else:
+            self._idle.put(worker)
+        if not ok:
+            raise value
+        return value
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._all)
+
+    def close(self) -> None:
+        """Stop all workers. Idempotent."""
+        self._closed = True
+        with self._lock:
+            workers, self._all = list(self._all), set()
+        for worker in workers:
+            worker.close()
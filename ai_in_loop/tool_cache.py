@@ -0,0 +1,151 @@
+"""Memoization of deterministic tool results.
+
+A tool whose result depends only on its arguments (and on state that has
+a version number, such as the document corpus) can be wrapped with
+``memoize_tool``. Calls are looked up in a shared, bounded LRU keyed by
+tool name, canonicalized arguments and the tool's version, so a repeated
+call within a conversation, or from another user, is answered without
+running the tool again.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import json
+from pathlib import Path
+import threading
+from typing import Any, Callable, Hashable
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel
+
+from .logging_utils import log_tool_cache_hit
+
+
+class ToolCache:
+    """Thread-safe LRU of tool results with hit/miss counters."""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize: int) -> None:
+        """Change the size limit, evicting entries that no longer fit."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def get(self, key: Hashable) -> str | None:
+        """Return the cached result, or None on a miss."""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Hashable, result: str) -> None:
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+
+    def invalidate(self, tool_name: str | None = None) -> None:
+        """Drop the results of one tool, or of all tools."""
+        with self._lock:
+            if tool_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == tool_name]:
+                    del self._entries[key]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def canonical_args(tool: BaseTool, args: dict[str, Any]) -> str:
+    """Arguments as a stable string: defaults filled in, types coerced, keys sorted.
+
+    {"expression": "2+2"} and {"expression": "2+2", "mode": "float"} give
+    the same string, so they share a cache entry.
+    """
+    schema = tool.args_schema
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        args = schema.model_validate(args).model_dump()
+    return json.dumps(args, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=repr)
+
+
+def memoize_tool(
+    tool: BaseTool,
+    cache: ToolCache,
+    version: Callable[[], Hashable] | None = None,
+    log_path: str | Path = "logs/runs.jsonl",
+) -> BaseTool:
+    """Wrap a deterministic tool so repeated calls are answered from cache.
+
+    The wrapper has the tool's name, description and argument schema, so
+    it can replace the tool in a ToolNode. Results starting with "Error:"
+    are not cached, since they may be transient (timeouts, missing
+    configuration).
+
+    Args:
+        tool: The tool to wrap
+        cache: Cache shared by all memoized tools
+        version: Invalidation hook; called on every lookup, and cached
+            results from another version are never returned
+        log_path: Where cache hits are logged, for runs that carry a
+            run_id in their config metadata
+    """
+
+    def lookup(config: RunnableConfig, kwargs: dict[str, Any]) -> tuple[Hashable, str | None]:
+        key = (tool.name, canonical_args(tool, kwargs), version() if version else None)
+        result = cache.get(key)
+        if result is not None:
+            run_id = (config.get("metadata") or {}).get("run_id")
+            if run_id:
+                log_tool_cache_hit(run_id, tool.name, kwargs, log_path)
+        return key, result
+
+    def store(key: Hashable, result: Any) -> None:
+        if isinstance(result, str) and not result.startswith("Error:"):
+            cache.put(key, result)
+
+    def run(config: RunnableConfig, **kwargs: Any) -> str:
+        key, result = lookup(config, kwargs)
+        if result is None:
+            result = tool.invoke(kwargs, config)
+            store(key, result)
+        return result
+
+    async def arun(config: RunnableConfig, **kwargs: Any) -> str:
+        key, result = lookup(config, kwargs)
+        if result is None:
+            result = await tool.ainvoke(kwargs, config)
+            store(key, result)
+        return result
+
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        infer_schema=False,
+    )
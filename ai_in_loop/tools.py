@@ -8,13 +8,33 @@ decorator for model-agnostic compatibility.
 from __future__ import annotations
 
 import ast
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import decimal
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
+import io
+from itertools import accumulate
+import keyword
 import math
 import operator
-from typing import Any, TYPE_CHECKING
+import re
+import statistics
+import threading
+import time
+import tokenize
+from typing import Any, Callable, Hashable, Iterator, NamedTuple, TYPE_CHECKING
 
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, tool
+import numpy as np
+
+from .sandbox import WorkerCrashedError, WorkerPool
 
 if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
     from .config import Config
 
 # Module-level config reference for search_docs tool
@@ -27,16 +47,226 @@ def set_search_config(cfg: Config) -> None:
     _search_config = cfg
 
 
+# Worker processes for python_calc, or None to evaluate in-process
+_calc_pool: WorkerPool | None = None
+
+
+def set_calc_config(cfg: Config) -> None:
+    """Configure python_calc's time limit and execution mode. Called at startup.
+
+    With cfg.calc_workers > 0, evaluations run in a pool of worker
+    processes, so heavy math never holds this process's GIL and a job that
+    overruns cfg.calc_timeout is killed. The pool is kept across calls
+    with the same settings.
+    """
+    global _calc_pool, _calc_timeout
+    _calc_timeout = cfg.calc_timeout
+    if _calc_pool is not None:
+        if cfg.calc_workers == _calc_pool.size() and cfg.calc_timeout == _calc_pool.timeout:
+            return
+        _calc_pool.close()
+        _calc_pool = None
+    if cfg.calc_workers > 0:
+        _calc_pool = WorkerPool(cfg.calc_workers, cfg.calc_timeout, preload=(__name__,))
+
+
+# Resource limits for expression evaluation. Operations are checked before
+# they run, so no single step can take long; the deadline is checked
+# between steps.
+EVAL_TIMEOUT_SECONDS = 2.0
+MAX_RESULT_DIGITS = 4000  # below Python's 4300-digit int-to-str limit
+MAX_INT_BITS = int(MAX_RESULT_DIGITS * math.log2(10))
+MAX_SEQUENCE_LENGTH = 10_000
+
+# Time limit used by the tools; set from Config.calc_timeout
+_calc_timeout: float = EVAL_TIMEOUT_SECONDS
+
+# Monotonic deadline of the evaluation running in this context, if any
+_deadline: ContextVar[float | None] = ContextVar("eval_deadline", default=None)
+
+
+@contextmanager
+def _time_limit(timeout: float | None) -> Iterator[None]:
+    """Set the evaluation deadline for the enclosed block."""
+    token = _deadline.set(time.monotonic() + timeout if timeout is not None else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _check_deadline() -> None:
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() > deadline:
+        raise SafeEvalError("Evaluation timed out")
+
+
+def _check_bits(bits: float, operation: str) -> None:
+    if bits > MAX_INT_BITS:
+        raise SafeEvalError(f"Result too large: {operation} would exceed {MAX_RESULT_DIGITS} digits")
+
+
+def _is_int(x: Any) -> bool:
+    return isinstance(x, int) and not isinstance(x, bool)
+
+
+def _object_arrays(*args: Any) -> bool:
+    """True if any argument is a NumPy array of Python objects (e.g. big ints)."""
+    return any(isinstance(arg, np.ndarray) and arg.dtype == object for arg in args)
+
+
+def _log2_factorial(n: int) -> float:
+    return math.lgamma(n + 1) / math.log(2)
+
+
+def _fraction_bits(x: Fraction | int) -> int:
+    return max(abs(x.numerator).bit_length(), x.denominator.bit_length())
+
+
+def _fraction_pow(base: Any, exponent: Any) -> Fraction:
+    """Exact rational power; only integer exponents keep the result rational."""
+    exponent = Fraction(exponent)
+    if exponent.denominator != 1:
+        raise SafeEvalError("Non-integer powers are not exact; use mode 'decimal' or 'float'")
+    base = Fraction(base)
+    if exponent and _fraction_bits(base) > 1:
+        _check_deadline()
+        _check_bits(abs(exponent.numerator) * _fraction_bits(base), "exponentiation")
+    return base ** exponent.numerator
+
+
+def _guarded_pow(base: Any, exponent: Any) -> Any:
+    """operator.pow, refusing integer powers whose result would be too large."""
+    if _object_arrays(base, exponent):
+        return np.frompyfunc(_guarded_pow, 2, 1)(base, exponent)
+    if isinstance(base, Fraction) or isinstance(exponent, Fraction):
+        return _fraction_pow(base, exponent)
+    if _is_int(base) and _is_int(exponent) and exponent > 0 and abs(base) > 1:
+        _check_deadline()
+        _check_bits(exponent * math.log2(abs(base)), "exponentiation")
+    return operator.pow(base, exponent)
+
+
+def _guarded_mul(left: Any, right: Any) -> Any:
+    """operator.mul, refusing oversized integer products and list repetitions."""
+    if _object_arrays(left, right):
+        return np.frompyfunc(_guarded_mul, 2, 1)(left, right)
+    if _is_int(left) and _is_int(right):
+        _check_bits(left.bit_length() + right.bit_length() - 1, "multiplication")
+    elif isinstance(left, (Fraction, int)) and isinstance(right, (Fraction, int)):
+        _check_bits(_fraction_bits(left) + _fraction_bits(right), "multiplication")
+    elif isinstance(left, list) or isinstance(right, list):
+        sequence, count = (left, right) if isinstance(left, list) else (right, left)
+        if _is_int(count) and len(sequence) * count > MAX_SEQUENCE_LENGTH:
+            raise SafeEvalError(f"Result too large: lists are limited to {MAX_SEQUENCE_LENGTH} items")
+    return operator.mul(left, right)
+
+
+def _guarded_factorial(n: Any) -> Any:
+    if _is_int(n) and n > 1:
+        _check_deadline()
+        _check_bits(_log2_factorial(n), "factorial")
+    return math.factorial(n)
+
+
+def _guarded_perm(n: Any, k: Any = None) -> Any:
+    if _is_int(n) and n > 1 and (k is None or (_is_int(k) and 0 < k <= n)):
+        _check_deadline()
+        k = n if k is None else k
+        # n!/(n-k)! is at most n**k; lgamma is accurate enough below 2**53
+        bits = k * math.log2(n) if n >= 2**53 else _log2_factorial(n) - _log2_factorial(n - k)
+        _check_bits(bits, "perm")
+    return math.perm(n, k)
+
+
+def _guarded_comb(n: Any, k: Any) -> Any:
+    if _is_int(n) and _is_int(k) and 0 < k < n:
+        _check_deadline()
+        k_min = min(k, n - k)
+        bits = (
+            k_min * math.log2(n) if n >= 2**53
+            else _log2_factorial(n) - _log2_factorial(k) - _log2_factorial(n - k)
+        )
+        _check_bits(bits, "comb")
+    return math.comb(n, k)
+
+
+def _guarded_round(number: Any, ndigits: Any = None) -> Any:
+    # Rounding an int to -n digits computes 10**n
+    if _is_int(ndigits) and abs(ndigits) > MAX_RESULT_DIGITS:
+        raise SafeEvalError(f"round() ndigits must be at most {MAX_RESULT_DIGITS} in magnitude")
+    return round(number, ndigits)
+
+
+def _check_result(result: Any) -> Any:
+    """Enforce the result-size cap on a final value."""
+    if _is_int(result):
+        _check_bits(result.bit_length(), "the result")
+    elif isinstance(result, Fraction):
+        _check_bits(_fraction_bits(result), "the result")
+    elif isinstance(result, list) and len(result) > MAX_SEQUENCE_LENGTH:
+        raise SafeEvalError(f"Result too large: lists are limited to {MAX_SEQUENCE_LENGTH} items")
+    return result
+
+
+def _as_array(values: Any, name: str) -> np.ndarray:
+    """A non-empty list as a float64 array, for the statistics functions."""
+    if not isinstance(values, list):
+        raise TypeError(f"{name}() needs a list of numbers")
+    array = np.asarray(values, dtype=np.float64)
+    if array.ndim != 1 or not array.size:
+        raise ValueError(f"{name}() needs a non-empty list of numbers")
+    return array
+
+
+def _check_percentile(q: Any) -> None:
+    if not 0 <= q <= 100:
+        raise ValueError("percentile must be between 0 and 100")
+
+
+def _stdev(values: list) -> float:
+    array = _as_array(values, "stdev")
+    if array.size < 2:
+        raise ValueError("stdev() needs at least two values")
+    return float(np.std(array, ddof=1))
+
+
+def _variance(values: list) -> float:
+    array = _as_array(values, "variance")
+    if array.size < 2:
+        raise ValueError("variance() needs at least two values")
+    return float(np.var(array, ddof=1))
+
+
+def _percentile(values: list, q: Any) -> float:
+    """q-th percentile (0-100) with linear interpolation between values."""
+    _check_percentile(q)
+    return float(np.percentile(_as_array(values, "percentile"), q))
+
+
+# Statistics over lists, computed on NumPy arrays. stdev and variance are
+# sample statistics (n - 1 denominator), like Python's statistics module.
+_STATS_FUNCTIONS: dict[str, Any] = {
+    "mean": lambda values: float(np.mean(_as_array(values, "mean"))),
+    "median": lambda values: float(np.median(_as_array(values, "median"))),
+    "stdev": _stdev,
+    "variance": _variance,
+    "percentile": _percentile,
+    "cumsum": lambda values: np.cumsum(_as_array(values, "cumsum")).tolist(),
+    "cumprod": lambda values: np.cumprod(_as_array(values, "cumprod")).tolist(),
+}
+
+
 # Safe operators for math expressions
 SAFE_OPERATORS: dict[type, Any] = {
     # Arithmetic operators
     ast.Add: operator.add,
     ast.Sub: operator.sub,
-    ast.Mult: operator.mul,
+    ast.Mult: _guarded_mul,
     ast.Div: operator.truediv,
     ast.FloorDiv: operator.floordiv,
     ast.Mod: operator.mod,
-    ast.Pow: operator.pow,
+    ast.Pow: _guarded_pow,
     ast.USub: operator.neg,
     ast.UAdd: operator.pos,
     # Comparison operators
@@ -52,7 +282,7 @@ SAFE_OPERATORS: dict[type, Any] = {
 SAFE_FUNCTIONS: dict[str, Any] = {
     # Built-in functions
     "abs": abs,
-    "round": round,
+    "round": _guarded_round,
     "min": min,
     "max": max,
     "sum": sum,
@@ -70,125 +300,1029 @@ SAFE_FUNCTIONS: dict[str, Any] = {
     "ceil": math.ceil,
     "pow": math.pow,
     # Combinatorics
-    "factorial": math.factorial,
-    "comb": math.comb,
-    "perm": math.perm,
+    "factorial": _guarded_factorial,
+    "comb": _guarded_comb,
+    "perm": _guarded_perm,
     # Inverse trigonometric functions
     "asin": math.asin,
     "acos": math.acos,
     "atan": math.atan,
     "atan2": math.atan2,
+    # Statistics on lists
+    **_STATS_FUNCTIONS,
     # Math constants
     "pi": math.pi,
     "e": math.e,
 }
 
 
+def _whole(x: Any) -> Any:
+    """Whole floats as ints, for integer-only math functions."""
+    return int(x) if isinstance(x, float) and x.is_integer() else x
+
+
+def _vector_reduce(ufunc: np.ufunc, name: str) -> Callable[..., Any]:
+    """Element-wise min/max: over the arguments, or over a single list."""
+
+    def reduce(*args: Any) -> Any:
+        if len(args) == 1:
+            if not isinstance(args[0], list):
+                raise TypeError(f"{name}() of a single value needs a list")
+            args = tuple(args[0])
+        if not args:
+            raise ValueError(f"{name}() arg is an empty sequence")
+        return ufunc.reduce(np.broadcast_arrays(*args))
+
+    return reduce
+
+
+def _vector_log(x: Any, base: Any = None) -> Any:
+    return np.log(x) if base is None else np.log(x) / np.log(base)
+
+
+def _vector_stat(reduce: Callable[..., Any], name: str) -> Callable[..., Any]:
+    """Element-wise statistic over a list of arrays, like _vector_reduce."""
+
+    def stat(values: Any, *args: Any) -> Any:
+        if not isinstance(values, list) or not values:
+            raise TypeError(f"{name}() needs a non-empty list")
+        return reduce(np.broadcast_arrays(*values), *args)
+
+    return stat
+
+
+def _vector_percentile(arrays: list, q: Any) -> Any:
+    _check_percentile(q)
+    return np.percentile(arrays, q, axis=0)
+
+
+# NumPy equivalents of SAFE_FUNCTIONS for batched evaluation. Combinatorics
+# have no ufunc and run element-wise on Python ints.
+SAFE_VECTOR_FUNCTIONS: dict[str, Any] = {
+    "abs": np.abs,
+    "round": np.round,
+    "min": _vector_reduce(np.minimum, "min"),
+    "max": _vector_reduce(np.maximum, "max"),
+    "sum": sum,
+    "len": len,
+    "sqrt": np.sqrt,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "log": _vector_log,
+    "log10": np.log10,
+    "log2": np.log2,
+    "exp": np.exp,
+    "floor": np.floor,
+    "ceil": np.ceil,
+    "pow": np.float_power,
+    "factorial": np.frompyfunc(lambda n: _guarded_factorial(_whole(n)), 1, 1),
+    "comb": np.frompyfunc(lambda n, k: _guarded_comb(_whole(n), _whole(k)), 2, 1),
+    "perm": np.frompyfunc(lambda n, k: _guarded_perm(_whole(n), _whole(k)), 2, 1),
+    "asin": np.arcsin,
+    "acos": np.arccos,
+    "atan": np.arctan,
+    "atan2": np.arctan2,
+    # Statistics across the list per element; cumulative ops have no
+    # per-element meaning and are not available in batches
+    "mean": _vector_stat(lambda arrays: np.mean(arrays, axis=0), "mean"),
+    "median": _vector_stat(lambda arrays: np.median(arrays, axis=0), "median"),
+    "stdev": _vector_stat(lambda arrays: np.std(arrays, axis=0, ddof=1), "stdev"),
+    "variance": _vector_stat(lambda arrays: np.var(arrays, axis=0, ddof=1), "variance"),
+    "percentile": _vector_stat(_vector_percentile, "percentile"),
+    "pi": math.pi,
+    "e": math.e,
+}
+
+# Arithmetic modes of safe_eval. Number literals become the mode's number
+# type; "float" is the default and uses SAFE_FUNCTIONS unchanged.
+EVAL_MODES = ("float", "decimal", "fraction")
+_NUMBER_TYPES: dict[str, type] = {"decimal": Decimal, "fraction": Fraction}
+
+# Significant digits of decimal mode unless a call sets its own
+DECIMAL_PRECISION = 28
+
+
+def _integral(x: Any) -> Any:
+    """Whole Decimal or Fraction values as ints, for integer-only math functions."""
+    if isinstance(x, Fraction) and x.denominator == 1:
+        return x.numerator
+    if isinstance(x, Decimal) and x.is_finite() and x == x.to_integral_value():
+        return int(x)
+    return x
+
+
+def _to_decimal(x: Any) -> Decimal:
+    return x if isinstance(x, Decimal) else Decimal(x)
+
+
+def _decimal_log(x: Any, base: Any = None) -> Decimal:
+    if base is None:
+        return _to_decimal(x).ln()
+    # Guard digits, so log(8, 2) rounds to 3 rather than 2.999...
+    with decimal.localcontext() as context:
+        context.prec += 5
+        result = _to_decimal(x).ln() / _to_decimal(base).ln()
+    return +result
+
+
+def _decimal_constants(digits: int) -> tuple[Decimal, Decimal]:
+    """pi and e to the given number of decimal places, from integer series."""
+    unity = 10 ** (digits + 10)  # guard digits absorb truncation error
+
+    def arctan_inv(x: int) -> int:
+        total = term = unity // x
+        n, sign = 3, -1
+        while term:
+            term //= x * x
+            total += sign * (term // n)
+            n, sign = n + 2, -sign
+        return total
+
+    pi = 4 * (4 * arctan_inv(5) - arctan_inv(239))  # Machin's formula
+    e = term = unity
+    k = 1
+    while term:
+        term //= k
+        e += term
+        k += 1
+    scale = Decimal(10) ** -(digits + 10)
+    with decimal.localcontext() as ctx:
+        ctx.prec = digits + 20
+        return Decimal(pi) * scale, Decimal(e) * scale
+
+
+def _exact_percentile(values: list, q: Any) -> Any:
+    """_percentile's linear interpolation in exact arithmetic."""
+    _check_percentile(q)
+    ordered = sorted(values)
+    if not ordered:
+        raise ValueError("percentile() needs a non-empty list of numbers")
+    position = (len(ordered) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+@lru_cache(maxsize=None)
+def _exact_functions(mode: str) -> dict[str, Any]:
+    """Function table of an exact mode, built on first use.
+
+    Both modes keep the integer, rounding and statistics functions, the
+    latter from the statistics module, which is exact for these types.
+    Decimal mode adds roots, logarithms, stdev and pi/e at the full
+    MAX_RESULT_DIGITS precision (each result is rounded to the call's
+    precision); trigonometry is float-only. Fraction mode only has
+    functions whose results stay rational.
+    """
+    functions: dict[str, Any] = {
+        "abs": abs,
+        "round": lambda number, ndigits=None: _guarded_round(number, _integral(ndigits)),
+        "min": min,
+        "max": max,
+        "sum": sum,
+        "len": len,
+        "floor": math.floor,
+        "ceil": math.ceil,
+        "pow": _guarded_pow,
+        "factorial": lambda n: _guarded_factorial(_integral(n)),
+        "comb": lambda n, k: _guarded_comb(_integral(n), _integral(k)),
+        "perm": lambda n, k=None: _guarded_perm(_integral(n), _integral(k)),
+        "mean": statistics.mean,
+        "median": statistics.median,
+        "variance": statistics.variance,
+        "percentile": _exact_percentile,
+        "cumsum": lambda values: list(accumulate(values)),
+        "cumprod": lambda values: list(accumulate(values, _guarded_mul)),
+    }
+    if mode == "decimal":
+        pi, e = _decimal_constants(MAX_RESULT_DIGITS)
+        functions.update({
+            "sqrt": lambda x: _to_decimal(x).sqrt(),
+            "exp": lambda x: _to_decimal(x).exp(),
+            "log": _decimal_log,
+            "log10": lambda x: _to_decimal(x).log10(),
+            "log2": lambda x: _decimal_log(x, 2),
+            "stdev": statistics.stdev,
+            "pi": pi,
+            "e": e,
+        })
+    return functions
+
+
+# Maximum number of elements per python_calc_batch call
+MAX_BATCH_SIZE = 10_000
+
+
 class SafeEvalError(Exception):
     """Raised when expression evaluation fails or is unsafe."""
 
     pass
 
 
-def _safe_eval_node(node: ast.AST) -> Any:
-    """Recursively evaluate an AST node using only safe operations.
+# Compiled expression: a closure tree called with the expression's numeric
+# literals, followed by the values of its variables
+CompiledExpression = Callable[[tuple], Any]
+
+# Maximum number of compiled expressions kept in the cache
+COMPILED_CACHE_SIZE = 1024
+
+# Longer expressions (e.g. big data lists) are compiled without caching:
+# they rarely repeat, and each entry would pin megabytes
+MAX_CACHED_EXPRESSION_LENGTH = 10_000
+
+# Decimal number literals. Expressions are cached by the text around these,
+# so "2 * 3" and "7 * 8" share one compiled closure tree.
+NUMBER_PATTERN = re.compile(
+    r"(?<![\w.])((?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d[\d_]*)?)(?![\w.])"
+)
+
+
+class _Scope(NamedTuple):
+    """What a compiled closure reads from its argument tuple, and how it computes."""
+
+    slots: dict[ast.AST, int]  # numeric constant nodes -> argument index
+    names: dict[str, int]  # variable names -> argument index
+    functions: dict[str, Any]  # SAFE_FUNCTIONS, SAFE_VECTOR_FUNCTIONS or an exact-mode table
+    vectorized: bool
+    number: type | None = None  # Decimal or Fraction for constants in exact modes
+
+
+# One instruction of a compiled program: updates the value stack in place and
+# returns the index of the next instruction to run, or None to continue
+Step = Callable[[list, tuple], "int | None"]
+
+
+def _push_value(value: Any) -> Step:
+    def step(stack: list, args: tuple) -> None:
+        stack.append(value)
+    return step
+
+
+def _push_arg(index: int) -> Step:
+    def step(stack: list, args: tuple) -> None:
+        stack.append(args[index])
+    return step
+
+
+def _apply_binary(binary_op: Callable[[Any, Any], Any]) -> Step:
+    def step(stack: list, args: tuple) -> None:
+        right = stack.pop()
+        stack[-1] = binary_op(stack[-1], right)
+    return step
+
+
+def _apply_unary(unary_op: Callable[[Any], Any]) -> Step:
+    def step(stack: list, args: tuple) -> None:
+        stack[-1] = unary_op(stack[-1])
+    return step
+
+
+def _apply_call(func: Callable[..., Any], num_args: int) -> Step:
+    if num_args == 0:
+        def call_without_args(stack: list, args: tuple) -> None:
+            stack.append(func())
+        return call_without_args
+
+    def step(stack: list, args: tuple) -> None:
+        call_args = stack[-num_args:]
+        del stack[-num_args:]
+        stack.append(func(*call_args))
+    return step
+
+
+def _build_list(length: int) -> Step:
+    def step(stack: list, args: tuple) -> None:
+        items = stack[len(stack) - length:]
+        del stack[len(stack) - length:]
+        stack.append(items)
+    return step
+
+
+def _apply_binary_leaf(binary_op: Callable[[Any, Any], Any], value: Any, index: int | None) -> Step:
+    """Binary operation whose right operand is a constant (index None) or an argument."""
+    if index is None:
+        def with_value(stack: list, args: tuple) -> None:
+            stack[-1] = binary_op(stack[-1], value)
+        return with_value
+
+    def with_arg(stack: list, args: tuple) -> None:
+        stack[-1] = binary_op(stack[-1], args[index])
+    return with_arg
+
+
+def _fold_chain(links: list[tuple[Callable[[Any, Any], Any], Any, int | None]]) -> Step:
+    """A left-nested chain like a + 1 - x * 2 ... folded in one step.
+
+    Each link is (operator, constant, argument index or None).
+    """
+    def step(stack: list, args: tuple) -> None:
+        result = stack[-1]
+        for binary_op, value, index in links:
+            result = binary_op(result, value if index is None else args[index])
+        stack[-1] = result
+    return step
+
+
+def _apply_call_leaf(links: list[tuple[Callable[[Any], Any], Any, int | None]]) -> Step:
+    """Call of a one-argument function on a constant or an argument."""
+    [(func, value, index)] = links
+    if index is None:
+        def with_value(stack: list, args: tuple) -> None:
+            stack.append(func(value))
+        return with_value
+
+    def with_arg(stack: list, args: tuple) -> None:
+        stack.append(func(args[index]))
+    return with_arg
+
+
+def _build_leaf_list(links: list[tuple[None, Any, int | None]]) -> Step:
+    """List display whose items are all constants or arguments, built in one step."""
+    values = [value for _, value, _ in links]
+    from_args = [(position, index) for position, (_, _, index) in enumerate(links) if index is not None]
+    if links and len(from_args) == len(links):
+        start = from_args[0][1]
+        if all(index == start + position for position, index in from_args):
+            # Literal-only lists read one contiguous run of arguments
+            stop = start + len(links)
+
+            def slice_args(stack: list, args: tuple) -> None:
+                stack.append(list(args[start:stop]))
+            return slice_args
+
+    def step(stack: list, args: tuple) -> None:
+        items = values.copy()
+        for position, index in from_args:
+            items[position] = args[index]
+        stack.append(items)
+    return step
+
+
+def _fold_leaves(links: list[tuple[Callable[[Any, Any], Any], Any, int | None]]) -> Step:
+    return _apply_binary_leaf(*links[0]) if len(links) == 1 else _fold_chain(links)
+
+
+def _compare_leaves(links: list[tuple[Callable[[Any, Any], Any], Any, int | None]]) -> Step:
+    """A whole scalar comparison chain whose right-hand operands are plain values."""
+    def step(stack: list, args: tuple) -> None:
+        left = stack[-1]
+        for compare_op, value, index in links:
+            right = value if index is None else args[index]
+            if not compare_op(left, right):
+                stack[-1] = False
+                return
+            left = right
+        stack[-1] = True
+    return step
+
+
+def _compare_step(compare_op: Callable[[Any, Any], Any], end: list[int], last: bool) -> Step:
+    """One link of a chained comparison, short-circuiting to end[0] on False."""
+    if last:
+        def step(stack: list, args: tuple) -> None:
+            right = stack.pop()
+            stack[-1] = True if compare_op(stack[-1], right) else False
+        return step
+
+    def step(stack: list, args: tuple) -> int | None:
+        right = stack.pop()
+        if not compare_op(stack[-1], right):
+            stack[-1] = False
+            return end[0]
+        stack[-1] = right  # For chained comparisons like 2 < 3 < 5
+        return None
+    return step
+
+
+def _compare_elements_step(compare_op: Callable[[Any, Any], Any]) -> Step:
+    """One link of an element-wise chained comparison; stack ends [..., result, right]."""
+    def step(stack: list, args: tuple) -> None:
+        right = stack.pop()
+        left = stack.pop()
+        stack[-1] = np.logical_and(stack[-1], compare_op(left, right))
+        stack.append(right)
+    return step
+
+
+def _discard(stack: list, args: tuple) -> None:
+    stack.pop()
+
+
+class _LeafLinks(NamedTuple):
+    """Work item: (function, constant or name node) pairs for a fused step.
+
+    The nodes are validated when the item is reached, so errors keep
+    evaluation order; make_step receives (function, value, index) triples.
+    """
+
+    links: list[tuple[Callable[..., Any], ast.AST]]
+    make_step: Callable[[list[tuple[Callable[..., Any], Any, int | None]]], Step]
+
+
+def _leaf(node: ast.AST, scope: _Scope) -> tuple[Any, int | None]:
+    """Validate a constant or name: (value, None) or (None, argument index)."""
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float)):
+            raise SafeEvalError(f"Unsupported constant type: {type(node.value).__name__}")
+        if node in scope.slots:
+            return None, scope.slots[node]
+        if scope.number is not None and not isinstance(node.value, bool):
+            return scope.number(repr(node.value)), None
+        return node.value, None
+    if node.id in scope.names:
+        return None, scope.names[node.id]
+    if node.id in scope.functions:
+        return scope.functions[node.id], None
+    if node.id in SAFE_FUNCTIONS:
+        raise SafeEvalError(f"{node.id} is not available in this mode")
+    raise SafeEvalError(f"Unknown variable: {node.id}")
+
+
+def _compile_node(node: ast.AST, scope: _Scope) -> CompiledExpression:
+    """Validate an AST and compile it into a flat program.
+
+    The tree is walked with an explicit work stack and the program runs on
+    an explicit value stack, so expressions of any length use constant
+    Python stack depth and linear time. Numeric literals in scope.slots
+    and variables in scope.names are read from the tuple passed to the
+    compiled function; all other values are bound at compile time.
 
     Args:
-        node: An AST node to evaluate
+        node: The root AST node to compile
+        scope: Argument layout and function table
 
     Returns:
-        The computed value
+        A function computing the expression's value from the argument tuple
 
     Raises:
         SafeEvalError: If the expression contains unsupported operations
     """
-    # Numbers
-    if isinstance(node, ast.Constant):
-        if isinstance(node.value, (int, float)):
-            return node.value
-        raise SafeEvalError(f"Unsupported constant type: {type(node.value).__name__}")
-
-    # Names (variables/constants like pi, e)
-    if isinstance(node, ast.Name):
-        if node.id in SAFE_FUNCTIONS:
-            return SAFE_FUNCTIONS[node.id]
-        raise SafeEvalError(f"Unknown variable: {node.id}")
-
-    # Binary operations (a + b, a * b, etc.)
-    if isinstance(node, ast.BinOp):
-        op_type = type(node.op)
-        if op_type not in SAFE_OPERATORS:
-            raise SafeEvalError(f"Unsupported operator: {op_type.__name__}")
-        left = _safe_eval_node(node.left)
-        right = _safe_eval_node(node.right)
-        return SAFE_OPERATORS[op_type](left, right)
-
-    # Unary operations (-x, +x)
-    if isinstance(node, ast.UnaryOp):
-        op_type = type(node.op)
-        if op_type not in SAFE_OPERATORS:
-            raise SafeEvalError(f"Unsupported unary operator: {op_type.__name__}")
-        operand = _safe_eval_node(node.operand)
-        return SAFE_OPERATORS[op_type](operand)
-
-    # Comparison operations (5 > 3, 2 < 3 < 5, x == y, etc.)
-    if isinstance(node, ast.Compare):
-        left = _safe_eval_node(node.left)
-        for op, comparator in zip(node.ops, node.comparators):
-            op_type = type(op)
+    program: list[Step] = []
+    has_jumps = False
+    # Work items in reverse order: an AST node to compile, a finished Step to
+    # append, a one-element list to fill with the current program length, or
+    # an error to raise once the operands before it have been validated
+    work: list[Any] = [node]
+    while work:
+        item = work.pop()
+        if isinstance(item, SafeEvalError):
+            raise item
+        if isinstance(item, list):
+            item[0] = len(program)  # jump target of a comparison chain
+            continue
+        if isinstance(item, _LeafLinks):
+            program.append(item.make_step([(func, *_leaf(operand, scope)) for func, operand in item.links]))
+            continue
+        if not isinstance(item, ast.AST):
+            program.append(item)
+            continue
+        node = item
+
+        # Numbers and names (variables/constants like pi, e)
+        if isinstance(node, (ast.Constant, ast.Name)):
+            value, index = _leaf(node, scope)
+            program.append(_push_value(value) if index is None else _push_arg(index))
+
+        # Binary operations (a + b, a * b, etc.)
+        elif isinstance(node, ast.BinOp):
+            # Walk down the left spine while right operands are plain values,
+            # so long chains like 1 + 2 + ... become one folding step
+            links = []
+            while isinstance(node, ast.BinOp) and isinstance(node.right, (ast.Constant, ast.Name)):
+                op_type = type(node.op)
+                if op_type not in SAFE_OPERATORS:
+                    raise SafeEvalError(f"Unsupported operator: {op_type.__name__}")
+                links.append((SAFE_OPERATORS[op_type], node.right))
+                node = node.left
+            if links:
+                # Compile the innermost left operand, then fold the links bottom-up
+                work += [_LeafLinks(links[::-1], _fold_leaves), node]
+                continue
+            op_type = type(node.op)
+            if op_type not in SAFE_OPERATORS:
+                raise SafeEvalError(f"Unsupported operator: {op_type.__name__}")
+            work += [_apply_binary(SAFE_OPERATORS[op_type]), node.right, node.left]
+
+        # Unary operations (-x, +x)
+        elif isinstance(node, ast.UnaryOp):
+            op_type = type(node.op)
             if op_type not in SAFE_OPERATORS:
-                raise SafeEvalError(f"Unsupported comparison operator: {op_type.__name__}")
-            right = _safe_eval_node(comparator)
-            if not SAFE_OPERATORS[op_type](left, right):
-                return False
-            left = right  # For chained comparisons like 2 < 3 < 5
-        return True
-
-    # Function calls (sqrt(x), sin(x), etc.)
-    if isinstance(node, ast.Call):
-        if not isinstance(node.func, ast.Name):
-            raise SafeEvalError("Only simple function calls are supported")
-        func_name = node.func.id
-        if func_name not in SAFE_FUNCTIONS:
-            raise SafeEvalError(f"Unknown function: {func_name}")
-        func = SAFE_FUNCTIONS[func_name]
-        if not callable(func):
-            raise SafeEvalError(f"{func_name} is not a function")
-        args = [_safe_eval_node(arg) for arg in node.args]
-        return func(*args)
-
-    # Lists/tuples for functions like min, max, sum
-    if isinstance(node, ast.List) or isinstance(node, ast.Tuple):
-        return [_safe_eval_node(elt) for elt in node.elts]
-
-    raise SafeEvalError(f"Unsupported expression type: {type(node).__name__}")
-
-
-def safe_eval(expression: str) -> float | int | bool:
+                raise SafeEvalError(f"Unsupported unary operator: {op_type.__name__}")
+            work += [_apply_unary(SAFE_OPERATORS[op_type]), node.operand]
+
+        # Comparison operations (5 > 3, 2 < 3 < 5, x == y, etc.)
+        elif isinstance(node, ast.Compare):
+            if not scope.vectorized and all(
+                type(op) in SAFE_OPERATORS and isinstance(comparator, (ast.Constant, ast.Name))
+                for op, comparator in zip(node.ops, node.comparators)
+            ):
+                links = [(SAFE_OPERATORS[type(op)], c) for op, c in zip(node.ops, node.comparators)]
+                work += [_LeafLinks(links, _compare_leaves), node.left]
+                continue
+            items: list[Any] = [] if not scope.vectorized else [_push_value(True)]
+            items.append(node.left)
+            end = [0]
+            for i, (op, comparator) in enumerate(zip(node.ops, node.comparators)):
+                op_type = type(op)
+                if op_type not in SAFE_OPERATORS:
+                    # Report after the operands before it, as evaluation order would
+                    items.append(SafeEvalError(f"Unsupported comparison operator: {op_type.__name__}"))
+                    break
+                compare_op = SAFE_OPERATORS[op_type]
+                items.append(comparator)
+                if scope.vectorized:
+                    items.append(_compare_elements_step(compare_op))
+                else:
+                    items.append(_compare_step(compare_op, end, last=i == len(node.ops) - 1))
+            if scope.vectorized:
+                items.append(_discard)
+            else:
+                has_jumps = has_jumps or len(node.ops) > 1
+                items.append(end)
+            work += reversed(items)
+
+        # Function calls (sqrt(x), sin(x), etc.)
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name):
+                raise SafeEvalError("Only simple function calls are supported")
+            func_name = node.func.id
+            if func_name not in scope.functions:
+                if func_name in SAFE_FUNCTIONS:
+                    raise SafeEvalError(f"{func_name} is not available in this mode")
+                raise SafeEvalError(f"Unknown function: {func_name}")
+            func = scope.functions[func_name]
+            if not callable(func):
+                raise SafeEvalError(f"{func_name} is not a function")
+            if len(node.args) == 1 and isinstance(node.args[0], (ast.Constant, ast.Name)):
+                work.append(_LeafLinks([(func, node.args[0])], _apply_call_leaf))
+                continue
+            work.append(_apply_call(func, len(node.args)))
+            work += reversed(node.args)
+
+        # Lists/tuples for functions like min, max, sum
+        elif isinstance(node, ast.List) or isinstance(node, ast.Tuple):
+            if all(isinstance(elt, (ast.Constant, ast.Name)) for elt in node.elts):
+                work.append(_LeafLinks([(None, elt) for elt in node.elts], _build_leaf_list))
+                continue
+            work.append(_build_list(len(node.elts)))
+            work += reversed(node.elts)
+
+        else:
+            raise SafeEvalError(f"Unsupported expression type: {type(node).__name__}")
+
+    if has_jumps:
+        def run(args: tuple) -> Any:
+            stack: list = []
+            position, end = 0, len(program)
+            while position < end:
+                target = program[position](stack, args)
+                position = position + 1 if target is None else target
+            return stack[0]
+    else:
+        def run(args: tuple) -> Any:
+            stack: list = []
+            for step in program:
+                step(stack, args)
+            return stack[0]
+
+    return run
+
+
+def _parse_literal(text: str) -> int | float:
+    """Convert a NUMBER_PATTERN match the way the Python parser would."""
+    if text.isdigit():
+        if text[0] == "0" and text.strip("0"):
+            raise ValueError(f"leading zeros in integer literal: {text}")
+        return int(text)
+    if "." in text or "e" in text or "E" in text:
+        return float(text)
+    # Underscore-grouped integer such as 1_000
+    if "__" in text or text.endswith("_"):
+        raise ValueError(f"invalid integer literal: {text}")
+    return _parse_literal(text.replace("_", ""))
+
+
+def _numeric_constants(tree: ast.AST) -> list[ast.Constant]:
+    """Int and float constant nodes in source order."""
+    nodes = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+                nodes.append(node)
+        elif isinstance(node, (ast.List, ast.Tuple)):
+            stack += reversed(node.elts)  # the common long case; skips iter_child_nodes
+        else:
+            stack += reversed(list(ast.iter_child_nodes(node)))
+    # Depth-first order is already source order for supported syntax, which
+    # makes this sort linear
+    return sorted(nodes, key=lambda node: (node.lineno, node.col_offset))
+
+
+class _CompiledCache:
+    """Thread-safe LRU of compiled expressions with hit/miss counters.
+
+    Exact-text keys map to (compiled, literals); template keys map to
+    (compiled, None).
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[CompiledExpression, tuple | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> tuple[CompiledExpression, tuple | None] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, compiled: CompiledExpression, literals: tuple | None) -> None:
+        with self._lock:
+            self._entries[key] = (compiled, literals)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_compiled_cache = _CompiledCache(COMPILED_CACHE_SIZE)
+
+
+# Operator tables for _parse_flat: (ast class, precedence) as in Python's grammar
+_FLAT_BINARY = {
+    "|": (ast.BitOr, 2), "^": (ast.BitXor, 3), "&": (ast.BitAnd, 4),
+    "<<": (ast.LShift, 5), ">>": (ast.RShift, 5),
+    "+": (ast.Add, 6), "-": (ast.Sub, 6),
+    "*": (ast.Mult, 7), "/": (ast.Div, 7), "//": (ast.FloorDiv, 7), "%": (ast.Mod, 7), "@": (ast.MatMult, 7),
+    "**": (ast.Pow, 9),
+}
+_FLAT_COMPARE = {
+    "<": ast.Lt, ">": ast.Gt, "<=": ast.LtE, ">=": ast.GtE, "==": ast.Eq, "!=": ast.NotEq,
+}
+_FLAT_UNARY = {"+": ast.UAdd, "-": ast.USub, "~": ast.Invert}
+_UNARY_PRECEDENCE = 8
+_CLOSING = {"(": ")", "[": "]"}
+
+
+class _Group(NamedTuple):
+    """Open bracket on the operator stack of _parse_flat."""
+
+    bracket: str  # "(" or "[", or "" for the whole expression
+    func: ast.expr | None  # Called function, for "(" after an operand
+    height: int  # Operand stack height when the bracket opened
+    commas: int = 0
+
+
+def _parse_flat(expression: str) -> ast.expr:
+    """Parse an expression without recursion.
+
+    Fallback for inputs too deeply nested for ast.parse, which recurses
+    once per operator in a chain. Covers the syntax safe_eval accepts
+    (numbers, names, operators, comparisons, calls, lists and tuples) with
+    Python's precedence, using operator-precedence parsing over tokens.
+
+    Raises:
+        SafeEvalError: On invalid or unsupported syntax
+    """
+    operands: list[ast.expr] = []
+    # Entries are _Group markers or (ast op class, precedence, kind) tuples
+    operators: list[Any] = [_Group("", None, 0)]
+    parenthesized: set[int] = set()  # ids of Compare nodes closed by brackets
+    expect_operand = True
+
+    def reduce() -> None:
+        op, _, kind = operators.pop()
+        if kind == "unary":
+            operands.append(ast.UnaryOp(op(), operands.pop()))
+            return
+        right = operands.pop()
+        left = operands.pop()
+        if kind == "binary":
+            operands.append(ast.BinOp(left, op(), right))
+        elif isinstance(left, ast.Compare) and id(left) not in parenthesized:
+            left.ops.append(op())  # a < b < c is one chained comparison
+            left.comparators.append(right)
+            operands.append(left)
+        else:
+            operands.append(ast.Compare(left, [op()], [right]))
+
+    def reduce_group() -> _Group:
+        while not isinstance(operators[-1], _Group):
+            reduce()
+        return operators[-1]
+
+    def push_binary(op: type, precedence: int, kind: str) -> None:
+        right_assoc = op is ast.Pow
+        while not isinstance(operators[-1], _Group) and (
+            operators[-1][1] > precedence or (operators[-1][1] == precedence and not right_assoc)
+        ):
+            reduce()
+        operators.append((op, precedence, kind))
+
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(expression).readline))
+    except (tokenize.TokenError, SyntaxError) as e:
+        raise SafeEvalError(f"Invalid syntax: {e.args[0]}") from e
+
+    for token in tokens:
+        kind, text = token.type, token.string
+        if kind in (tokenize.NEWLINE, tokenize.NL, tokenize.ENDMARKER, tokenize.COMMENT):
+            continue
+
+        if expect_operand:
+            top = operators[-1]
+            if kind in (tokenize.NUMBER, tokenize.STRING) or text in ("True", "False", "None"):
+                value = ast.literal_eval(text)
+                operands.append(ast.Constant(value, lineno=token.start[0], col_offset=token.start[1]))
+                expect_operand = False
+            elif kind == tokenize.NAME and not keyword.iskeyword(text):
+                operands.append(ast.Name(text, ast.Load()))
+                expect_operand = False
+            elif text in _FLAT_UNARY:
+                operators.append((_FLAT_UNARY[text], _UNARY_PRECEDENCE, "unary"))
+            elif text in _CLOSING:
+                operators.append(_Group(text, None, len(operands)))
+            elif (
+                text in (")", "]") and isinstance(top, _Group) and top.bracket
+                and len(operands) - top.height == top.commas
+            ):
+                # Empty brackets, f(), or a trailing comma
+                _close_group(operators, operands, text, parenthesized)
+                expect_operand = False
+            else:
+                raise SafeEvalError(f"Invalid syntax: unexpected {text!r}")
+            continue
+
+        if expect_operand is None:
+            if kind != tokenize.NAME:
+                raise SafeEvalError(f"Invalid syntax: unexpected {text!r}")
+            operands.append(ast.Attribute(operands.pop(), text, ast.Load()))
+            expect_operand = False
+            continue
+
+        if text in _FLAT_BINARY:
+            push_binary(*_FLAT_BINARY[text], "binary")
+            expect_operand = True
+        elif text in _FLAT_COMPARE:
+            push_binary(_FLAT_COMPARE[text], 1, "compare")
+            expect_operand = True
+        elif text == "(":
+            operators.append(_Group("(", operands.pop(), len(operands)))
+            expect_operand = True
+        elif text == ".":
+            expect_operand = None  # next token must be the attribute name
+        elif text == ",":
+            group = reduce_group()
+            operators[-1] = group._replace(commas=group.commas + 1)
+            expect_operand = True
+        elif text in (")", "]"):
+            reduce_group()
+            _close_group(operators, operands, text, parenthesized)
+        else:
+            raise SafeEvalError(f"Invalid syntax: unsupported token {text!r}")
+
+    if expect_operand is not False:
+        raise SafeEvalError("Invalid syntax: unexpected end of expression")
+    group = reduce_group()
+    if len(operators) != 1:
+        raise SafeEvalError(f"Invalid syntax: {group.bracket!r} was never closed")
+    if group.commas:
+        return ast.Tuple(operands, ast.Load())  # 1, 2 evaluates to a tuple
+    [result] = operands
+    return result
+
+
+def _close_group(operators: list[Any], operands: list[ast.expr], closing: str, parenthesized: set[int]) -> None:
+    """Pop the innermost _Group and replace its operands with the node it forms."""
+    group = operators.pop()
+    if not isinstance(group, _Group) or _CLOSING.get(group.bracket) != closing:
+        raise SafeEvalError(f"Invalid syntax: unmatched {closing!r}")
+    items = operands[group.height:]
+    del operands[group.height:]
+    if group.func is not None:
+        operands.append(ast.Call(group.func, items, []))
+    elif closing == "]":
+        operands.append(ast.List(items, ast.Load()))
+    elif len(items) == 1 and not group.commas:
+        parenthesized.add(id(items[0]))
+        operands.append(items[0])
+    else:
+        operands.append(ast.Tuple(items, ast.Load()))
+
+
+def _parse_expression(expression: str) -> ast.expr:
+    """ast.parse in eval mode, with _parse_flat for very deep expressions."""
+    try:
+        return ast.parse(expression, mode="eval").body
+    except SyntaxError as e:
+        raise SafeEvalError(f"Invalid syntax: {e.msg}") from e
+    except (RecursionError, MemoryError):
+        # The parser recurses per nesting level, so a long chain like
+        # 1 + 1 + ... overflows it. The flat parser has no depth limit.
+        return _parse_flat(expression)
+
+
+def compile_expression(
+    expression: str, names: tuple[str, ...] = (), vectorized: bool = False, mode: str = "float"
+) -> tuple[CompiledExpression, tuple]:
+    """Parse, validate and compile an expression, using the cache.
+
+    Repeated expressions are found by their exact text. Otherwise the
+    expression is looked up by its template (the text around its number
+    literals), so a hit skips parsing and validation even when only the
+    numbers changed. If the literals found in the text cannot be matched to
+    the parsed constants (e.g. digits inside a string), only the exact text
+    is cached. Expressions over MAX_CACHED_EXPRESSION_LENGTH are not cached.
+
+    Args:
+        expression: The expression to compile
+        names: Variable names, read from the arguments after the literals
+        vectorized: Compile with SAFE_VECTOR_FUNCTIONS for NumPy arrays
+        mode: One of EVAL_MODES; exact modes read literals from their text
+
+    Returns:
+        (compiled closure, literals tuple; call it with literals + variable values)
+
+    Raises:
+        SafeEvalError: If the expression is invalid or contains unsafe operations
+    """
+    # Same text compiles differently per variable set and function table
+    variant = (names, vectorized, mode)
+    exact_key = (variant, expression)
+    cacheable = len(expression) <= MAX_CACHED_EXPRESSION_LENGTH
+    cached = _compiled_cache.get(exact_key) if cacheable else None
+    if cached is not None:
+        _compiled_cache.record(hit=True)
+        return cached
+
+    # Alternating text segments and literals. The segments form the template
+    # key; as a tuple it never equals an exact-text key.
+    parts = NUMBER_PATTERN.split(expression)
+    template_key = (variant, tuple(parts[0::2]))
+    number = _NUMBER_TYPES.get(mode)
+    try:
+        literals = tuple(_parse_literal(text) for text in parts[1::2])
+    except ValueError:
+        literals = None
+    arguments = literals
+    if number is not None and literals is not None:
+        # Decimal("0.1") and Fraction("0.1") are exact; the float 0.1 is not
+        arguments = tuple(number(text.replace("_", "")) for text in parts[1::2])
+
+    cached = _compiled_cache.get(template_key) if cacheable and literals is not None else None
+    _compiled_cache.record(hit=cached is not None)
+    if cached is not None:
+        compiled = cached[0]
+        _compiled_cache.put(exact_key, compiled, arguments)
+        return compiled, arguments
+
+    body = _parse_expression(expression)
+    if number is not None:
+        functions = _exact_functions(mode)
+    else:
+        functions = SAFE_VECTOR_FUNCTIONS if vectorized else SAFE_FUNCTIONS
+    constants = _numeric_constants(body)
+    if literals is not None and [(type(v), v) for v in literals] == [
+        (type(node.value), node.value) for node in constants
+    ]:
+        slots = {node: i for i, node in enumerate(constants)}
+        variables = {name: len(literals) + i for i, name in enumerate(names)}
+        compiled = _compile_node(body, _Scope(slots, variables, functions, vectorized, number))
+        if cacheable:
+            _compiled_cache.put(template_key, compiled, None)
+            _compiled_cache.put(exact_key, compiled, arguments)
+        return compiled, arguments
+
+    variables = {name: i for i, name in enumerate(names)}
+    compiled = _compile_node(body, _Scope({}, variables, functions, vectorized, number))
+    if cacheable:
+        _compiled_cache.put(exact_key, compiled, ())
+    return compiled, ()
+
+
+def compiled_cache_stats() -> dict[str, float]:
+    """Size, hit and miss counters and hit rate of the compiled-expression cache."""
+    return _compiled_cache.stats()
+
+
+def safe_eval(
+    expression: str,
+    timeout: float | None = EVAL_TIMEOUT_SECONDS,
+    mode: str = "float",
+    precision: int | None = None,
+) -> float | int | bool | Decimal | Fraction:
     """Safely evaluate a mathematical expression.
 
     Uses AST parsing to only allow whitelisted operators and functions.
-    No arbitrary code execution is possible.
+    No arbitrary code execution is possible. Validated expressions are
+    compiled once and cached (see compile_expression).
+
+    Expensive operations (integer powers, factorial, comb, perm) have their
+    result size estimated before they run and are refused above
+    MAX_RESULT_DIGITS digits, and evaluation stops once timeout seconds
+    have passed.
+
+    In "decimal" mode numbers are Decimals rounded to precision significant
+    digits (default DECIMAL_PRECISION), so 0.1 + 0.2 is exactly 0.3. In
+    "fraction" mode numbers are exact Fractions; functions whose results
+    are irrational (sqrt, log, trigonometry) are not available there.
 
     Args:
         expression: A math expression like "2 + 2" or "sqrt(16) * 3"
+        timeout: Wall-clock limit in seconds, or None for no limit
+        mode: "float", "decimal" or "fraction"
+        precision: Significant digits for decimal mode, 1 to MAX_RESULT_DIGITS
 
     Returns:
         The computed numeric result
 
     Raises:
-        SafeEvalError: If the expression is invalid or contains unsafe operations
+        SafeEvalError: If the expression is invalid, contains unsafe
+            operations, or exceeds the time or size limits
     """
-    try:
-        tree = ast.parse(expression, mode="eval")
-    except SyntaxError as e:
-        raise SafeEvalError(f"Invalid syntax: {e.msg}") from e
+    if mode != "float" or precision is not None:
+        return _safe_eval_exact(expression, timeout, mode, precision)
+    compiled, literals = compile_expression(expression)
+    with _time_limit(timeout):
+        return _check_result(compiled(literals))
 
-    return _safe_eval_node(tree.body)
+
+def _safe_eval_exact(
+    expression: str, timeout: float | None, mode: str, precision: int | None
+) -> int | bool | Decimal | Fraction:
+    """safe_eval in decimal or fraction mode."""
+    if mode not in EVAL_MODES:
+        raise SafeEvalError(f"Unknown mode: {mode!r}; use one of {', '.join(EVAL_MODES)}")
+    if precision is not None and mode != "decimal":
+        raise SafeEvalError("precision only applies to mode 'decimal'")
+    if precision is None:
+        precision = DECIMAL_PRECISION
+    if not 1 <= precision <= MAX_RESULT_DIGITS:
+        raise SafeEvalError(f"precision must be between 1 and {MAX_RESULT_DIGITS}")
+
+    compiled, literals = compile_expression(expression, mode=mode)
+    with _time_limit(timeout), decimal.localcontext() as context:
+        context.prec = precision
+        result = _check_result(compiled(literals))
+        # Round values that never went through an operation, like pi
+        return +result if isinstance(result, Decimal) else result
+
+
+def _format_result(result: Any) -> str:
+    """Format a computed value; whole floats are shown without decimals."""
+    if isinstance(result, float) and result.is_integer():
+        return str(int(result))
+    return str(result)
+
+
+def _calc_result(evaluate: Callable[[], Any]) -> str:
+    """Run an evaluation and format its result or error for the LLM."""
+    try:
+        return _format_result(evaluate())
+    except SafeEvalError as e:
+        return f"Error: {e}"
+    except ZeroDivisionError:
+        return "Error: Division by zero"
+    except (OverflowError, decimal.Overflow):
+        return "Error: Result too large"
+    except decimal.InvalidOperation:
+        return "Error: Invalid decimal operation"
+    except ValueError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error: Unexpected error - {type(e).__name__}: {e}"
 
 
 @tool
-def python_calc(expression: str) -> str:
+def python_calc(expression: str, mode: str = "float", precision: int | None = None) -> str:
     """Evaluate a mathematical expression safely.
 
     Use this tool to perform arithmetic, comparisons, or other mathematical
@@ -200,55 +1334,167 @@ def python_calc(expression: str) -> str:
     - Trig functions: sin, cos, tan, asin, acos, atan, atan2
     - Other math: sqrt, log, log10, log2, exp, floor, ceil, pow
     - Combinatorics: factorial, comb, perm
+    - Statistics on lists: mean, median, stdev, variance,
+      percentile(list, q) with q in 0-100, cumsum, cumprod
     - Constants: pi, e
 
+    Integer results are limited to 4000 digits.
+
+    For money and other exact decimal arithmetic use mode "decimal"
+    (0.1 + 0.2 gives exactly 0.3); for exact ratios use mode "fraction"
+    (1/3 + 1/6 gives 1/2). Trig functions are float-only; fraction mode
+    also has no sqrt, log, exp, pi or e.
+
     Args:
         expression: A math expression like "2 + 2", "sqrt(16) * 3",
                    or "sin(pi / 2)". Use 'pi' and 'e' for constants.
+        mode: "float" (default), "decimal" or "fraction".
+        precision: Significant digits in decimal mode (default 28).
 
     Returns:
         The computed result as a string, or an error message if evaluation fails.
     """
+    if _calc_pool is not None:
+        return _run_in_pool(_calc_job, expression, _calc_timeout, mode, precision)
+    return _calc_job(expression, _calc_timeout, mode, precision)
+
+
+def _calc_job(expression: str, timeout: float, mode: str = "float", precision: int | None = None) -> str:
+    """python_calc's evaluation; runs in a worker process when a pool is set."""
+    return _calc_result(lambda: safe_eval(expression, timeout, mode, precision))
+
+
+def _run_in_pool(job: Callable[..., str], *args: Any) -> str:
+    """Run a calculator job in the worker pool, reporting failures as errors."""
+    try:
+        return _calc_pool.run(job, *args)
+    except TimeoutError:
+        return "Error: Evaluation timed out"
+    except WorkerCrashedError:
+        return "Error: Evaluation failed (worker process crashed)"
+
+
+@tool
+def python_calc_batch(expression: str, variables: dict[str, list[float]]) -> str:
+    """Evaluate one mathematical expression for many input values at once.
+
+    Use this tool instead of repeated python_calc calls when the same formula
+    must be computed for a list of values. Supports the same operators,
+    functions and constants as python_calc.
+
+    Args:
+        expression: A math expression using the variable names, like
+                   "price * (1 + rate / 100)".
+        variables: Variable names mapped to equal-length lists of numbers,
+                   like {"price": [10, 20, 30], "rate": [5, 5, 8]}.
+
+    Returns:
+        One line per element as "index: result", or an error message.
+        Elements that fail report their own error, as python_calc would.
+    """
+    if _calc_pool is not None:
+        return _run_in_pool(_batch_job, expression, variables, _calc_timeout)
+    return _batch_job(expression, variables, _calc_timeout)
+
+
+def _batch_job(expression: str, variables: dict[str, list[float]], timeout: float) -> str:
+    """python_calc_batch's evaluation; runs in a worker process when a pool is set."""
+    names = tuple(variables)
+    for name in names:
+        if not name.isidentifier():
+            return f"Error: Invalid variable name: {name}"
+        if name in SAFE_FUNCTIONS:
+            return f"Error: Variable name '{name}' is reserved"
+
+    lengths = {len(values) for values in variables.values()}
+    if len(lengths) > 1:
+        return "Error: All variable lists must have the same length"
+    size = lengths.pop() if lengths else 1
+    if not 1 <= size <= MAX_BATCH_SIZE:
+        return f"Error: Variable lists must have between 1 and {MAX_BATCH_SIZE} values"
+
     try:
-        result = safe_eval(expression)
-        # Format nicely: avoid unnecessary decimals for whole numbers
-        if isinstance(result, float) and result.is_integer():
-            return str(int(result))
-        return str(result)
+        vector, vector_literals = compile_expression(expression, names, vectorized=True)
+        scalar, scalar_literals = compile_expression(expression, names)
     except SafeEvalError as e:
         return f"Error: {e}"
-    except ZeroDivisionError:
-        return "Error: Division by zero"
-    except OverflowError:
-        return "Error: Result too large"
-    except ValueError as e:
-        return f"Error: {e}"
-    except Exception as e:
-        return f"Error: Unexpected error - {type(e).__name__}: {e}"
 
+    lines = []
+    with _time_limit(timeout):
+        # One NumPy pass over all elements
+        columns = tuple(np.asarray(values, dtype=np.float64) for values in variables.values())
+        try:
+            with np.errstate(all="ignore"):
+                results = np.broadcast_to(vector(vector_literals + columns), (size,)).tolist()
+        except Exception:
+            results = None  # e.g. factorial of a negative element; evaluated one by one below
 
-@tool
-def search_docs(query: str) -> str:
+        for i in range(size):
+            result = None if results is None else results[i]
+            if result is None or (isinstance(result, float) and not math.isfinite(result)):
+                # NumPy returns inf/nan where Python raises; redo the element to report the same error
+                row = scalar_literals + tuple(_whole(values[i]) for values in variables.values())
+                lines.append(f"{i}: {_calc_result(lambda: _check_result(scalar(row)))}")
+            else:
+                lines.append(f"{i}: {_calc_result(lambda: _check_result(result))}")
+    return "\n".join(lines)
+
+
+def _search_docs(
+    query: str,
+    k: int | None = None,
+    min_score: float | None = None,
+    max_chars: int | None = None,
+) -> str:
     """Search documents for information relevant to the query.
 
     Use this tool to find information from documents in the resources/ directory.
 
     Args:
         query: The search query describing what information you need.
+        k: Optional number of passages to return (1-50).
+        min_score: Optional minimum relevance score; weaker matches are dropped.
+        max_chars: Optional limit on the total characters of returned passages.
 
     Returns:
         Relevant document passages with source info, or a message if none found.
     """
-    from .retriever import get_retriever
+    from .retriever import search_documents
+
+    error = _check_search_args(k, max_chars)
+    if error:
+        return error
+    return _format_search_results(search_documents(_search_config, query, k, min_score, max_chars))
+
+
+async def _asearch_docs(
+    query: str,
+    k: int | None = None,
+    min_score: float | None = None,
+    max_chars: int | None = None,
+) -> str:
+    from .retriever import asearch_documents
+
+    error = _check_search_args(k, max_chars)
+    if error:
+        return error
+    return _format_search_results(await asearch_documents(_search_config, query, k, min_score, max_chars))
 
+
+def _check_search_args(k: int | None, max_chars: int | None) -> str | None:
     if _search_config is None:
         return "Error: Search not configured."
+    if k is not None and not 1 <= k <= 50:
+        return "Error: k must be between 1 and 50."
+    if max_chars is not None and max_chars <= 0:
+        return "Error: max_chars must be positive."
+    return None
+
 
-    retriever = get_retriever(_search_config)
-    if retriever is None:
+def _format_search_results(results: list[Document] | None) -> str:
+    if results is None:
         return "No documents available. The resources/ directory may be empty."
 
-    results = retriever.invoke(query)
     if not results:
         return "No relevant documents found."
 
@@ -256,3 +1502,12 @@ def search_docs(query: str) -> str:
         f"Source: {doc.metadata.get('source', 'unknown')}\nContent: {doc.page_content}"
         for doc in results
     )
+
+
+# Built from a function pair rather than with @tool so that ainvoke
+# answers cached queries on the event loop instead of in a thread
+search_docs = StructuredTool.from_function(
+    func=_search_docs,
+    coroutine=_asearch_docs,
+    name="search_docs",
+)
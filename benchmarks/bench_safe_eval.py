@@ -0,0 +1,89 @@
+"""Compare the flat safe_eval evaluator with a recursive tree walker.
+
+The recursive walker is the evaluator safe_eval used before it compiled
+expressions into flat programs: one Python call per AST node, so long
+chains cost a stack frame per term and overflow the recursion limit.
+
+Usage:
+    python benchmarks/bench_safe_eval.py
+"""
+
+from __future__ import annotations
+
+import ast
+from pathlib import Path
+import sys
+import timeit
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai_in_loop.tools import (  # noqa: E402
+    SAFE_FUNCTIONS,
+    SAFE_OPERATORS,
+    SafeEvalError,
+    _parse_expression,
+    compile_expression,
+)
+
+
+def recursive_eval(node: ast.AST) -> Any:
+    """Reference recursive evaluator over the same operator tables."""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        return SAFE_FUNCTIONS[node.id]
+    if isinstance(node, ast.BinOp):
+        return SAFE_OPERATORS[type(node.op)](recursive_eval(node.left), recursive_eval(node.right))
+    if isinstance(node, ast.UnaryOp):
+        return SAFE_OPERATORS[type(node.op)](recursive_eval(node.operand))
+    if isinstance(node, ast.Compare):
+        left = recursive_eval(node.left)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = recursive_eval(comparator)
+            if not SAFE_OPERATORS[type(op)](left, right):
+                return False
+            left = right
+        return True
+    if isinstance(node, ast.Call):
+        return SAFE_FUNCTIONS[node.func.id](*[recursive_eval(arg) for arg in node.args])
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [recursive_eval(elt) for elt in node.elts]
+    raise SafeEvalError(f"Unsupported expression type: {type(node).__name__}")
+
+
+CASES = {
+    "mixed": "sqrt(16) * 3 + sin(pi / 2) - 2 ** 3",
+    "compare": "1 < 2 < 3 <= 4",
+    "calls": "max([abs(-3), floor(2.5), sqrt(pi)]) + pow(3, 4)",
+    "sum 100": "+".join(["1"] * 100),
+    "sum 900": "+".join(["1"] * 900),
+    "mixed 900": " - ".join(["2 * x"] * 450).replace("x", "3"),
+    "sum 10000": "+".join(["1"] * 10_000),
+    "negate 5000": "-" * 5000 + "1",
+}
+
+
+def _per_call(func: Any, arg: Any) -> float:
+    timer = timeit.Timer(lambda: func(arg))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def main() -> None:
+    print(f"{'case':<12} {'recursive':>12} {'flat':>12} {'speedup':>8}")
+    for name, expression in CASES.items():
+        compiled, literals = compile_expression(expression)
+        flat = _per_call(compiled, literals)
+
+        tree = _parse_expression(expression)
+        try:
+            recursive = _per_call(recursive_eval, tree)
+        except RecursionError:
+            print(f"{name:<12} {'RecursionError':>12} {flat * 1e6:>10.2f}us {'-':>8}")
+            continue
+        print(f"{name:<12} {recursive * 1e6:>10.2f}us {flat * 1e6:>10.2f}us {recursive / flat:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Tests for the memory-mapped chunk store."""
+
+import pytest
+
+from ai_in_loop.chunk_store import MappedJSON, MappedStrings, write_json, write_strings
+
+
+class TestMappedStrings:
+    """Tests for MappedStrings."""
+
+    def test_roundtrip(self, tmp_path):
+        """Test that strings read back unchanged, including non-ASCII text."""
+        strings = ["alpha", "", "naïve café ☕", "last"]
+        write_strings(tmp_path, "texts", strings)
+
+        mapped = MappedStrings(tmp_path, "texts")
+        assert len(mapped) == 4
+        assert list(mapped) == strings
+        assert mapped[2] == "naïve café ☕"
+        assert mapped[-1] == "last"
+        assert mapped[1:3] == ["", "naïve café ☕"]
+
+    def test_out_of_range(self, tmp_path):
+        """Test that indexing past the end raises IndexError."""
+        write_strings(tmp_path, "texts", ["only"])
+        with pytest.raises(IndexError):
+            MappedStrings(tmp_path, "texts")[1]
+
+    def test_empty_store(self, tmp_path):
+        """Test that an empty store can be opened."""
+        write_strings(tmp_path, "texts", [])
+        assert len(MappedStrings(tmp_path, "texts")) == 0
+
+
+class TestMappedJSON:
+    """Tests for MappedJSON."""
+
+    def test_roundtrip(self, tmp_path):
+        """Test that JSON values are parsed on access."""
+        values = [{"source": "a.txt"}, {"source": "b.pdf", "page": 3}]
+        write_json(tmp_path, "metadata", values)
+        assert list(MappedJSON(tmp_path, "metadata")) == values
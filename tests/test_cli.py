@@ -0,0 +1,43 @@
+"""Tests for streamed output in the CLI."""
+
+from langchain_core.messages import HumanMessage
+
+from ai_in_loop.cli import _stream_turn
+from ai_in_loop.config import Config
+from ai_in_loop.graph import build_app
+
+
+def _mock_config():
+    return Config(
+        use_gemini=False,
+        gemini_api_key=None,
+        gemini_model="gemini-2.5-flash",
+        temperature=0.7,
+        thinking_level=None,
+        thinking_budget=0,
+        system_prompt_file="prompts/empty.md",
+        resources_dir="resources",
+        chunk_size=1000,
+        chunk_overlap=100,
+    )
+
+
+class TestStreamTurn:
+    """Tests for _stream_turn."""
+
+    def test_prints_tool_activity_then_response(self, capsys):
+        """Test that tool calls, results and the streamed answer appear in order."""
+        turn = _stream_turn(build_app(_mock_config()), [HumanMessage(content="Calculate 5 + 3")], "r1", "Model> ")
+
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[0].startswith("Tool call: python_calc(")
+        assert lines[1] == "Tool result: 8"
+        assert lines[2] == "Model> [MOCK] The calculation result is: 8"
+        assert [m.type for m in turn.messages] == ["ai", "tool", "ai"]
+
+    def test_records_time_to_first_token(self, capsys):
+        """Test that the first token arrives before the turn finishes."""
+        turn = _stream_turn(build_app(_mock_config()), [HumanMessage(content="Hello")], "r1")
+
+        assert capsys.readouterr().out.startswith("[MOCK] Received 1 line(s)")
+        assert 0 < turn.ttft_seconds <= turn.elapsed_seconds
@@ -0,0 +1,86 @@
+"""Tests for dense-vector retrieval and rank fusion."""
+
+import numpy as np
+import pytest
+
+from ai_in_loop.dense import DenseIndex, HashingEmbedder, load_embedder, reciprocal_rank_fusion
+
+
+TEXTS = [
+    "Python is a programming language with simple syntax.",
+    "Water tomatoes in the morning during hot summers.",
+    "The stock market closed higher after strong earnings.",
+    "Rust programs avoid memory errors through ownership.",
+]
+
+
+class CountingEmbedder(HashingEmbedder):
+    """Hashing embedder that records how many texts it embedded."""
+
+    def __init__(self):
+        super().__init__(64)
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+class TestHashingEmbedder:
+    """Tests for the offline hashing embedder."""
+
+    def test_deterministic_and_normalized(self):
+        """Test that embeddings are stable and unit length."""
+        first = HashingEmbedder().embed(TEXTS)
+        second = HashingEmbedder().embed(TEXTS)
+        assert np.array_equal(first, second)
+        assert np.linalg.norm(first, axis=1) == pytest.approx(np.ones(len(TEXTS)), rel=1e-5)
+
+    def test_related_word_forms_are_similar(self):
+        """Test that shared trigrams make word variants closer than unrelated text."""
+        vectors = HashingEmbedder().embed(["programmer", "programming", "tomatoes"])
+        assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+    def test_load_embedder_spec(self):
+        """Test that hashing specs select the dimension."""
+        assert load_embedder("hashing").dim == 256
+        assert load_embedder("hashing:32").name == "hashing-32"
+
+
+class TestDenseIndex:
+    """Tests for the IVF dense index."""
+
+    def test_finds_nearest_text(self):
+        """Test that a paraphrased query finds the related chunk."""
+        dense = DenseIndex.build(HashingEmbedder(), TEXTS)
+        results = dense.search(["gardening tomato watering"], 1)
+        assert results[0][0][0] == 1
+
+    def test_reuses_vectors_of_unchanged_texts(self):
+        """Test that rebuilding only embeds new chunks."""
+        embedder = CountingEmbedder()
+        previous = DenseIndex.build(embedder, TEXTS[:3])
+        embedder.embedded = 0
+
+        rebuilt = DenseIndex.build(embedder, TEXTS[1:], previous)
+        assert embedder.embedded == 1
+        assert np.array_equal(rebuilt.vectors[0], previous.vectors[1])
+
+    def test_save_and_load(self, tmp_path):
+        """Test that a saved index loads only under the same key."""
+        dense = DenseIndex.build(HashingEmbedder(), TEXTS)
+        dense.save(tmp_path, {"generation": "a"})
+
+        loaded = DenseIndex.load(tmp_path, HashingEmbedder(), {"generation": "a"})
+        assert loaded is not None
+        assert loaded.search(["stock earnings"], 2) == dense.search(["stock earnings"], 2)
+        assert DenseIndex.load(tmp_path, HashingEmbedder(), {"generation": "b"}) is None
+
+
+class TestReciprocalRankFusion:
+    """Tests for reciprocal_rank_fusion."""
+
+    def test_documents_in_both_lists_rank_first(self):
+        """Test that agreement between rankings wins."""
+        fused = reciprocal_rank_fusion([[(1, 9.0), (2, 5.0)], [(3, 0.9), (2, 0.8)]], 3)
+        assert [doc_id for doc_id, _ in fused] == [2, 1, 3]
@@ -0,0 +1,158 @@
+"""Tests for the BM25 inverted index."""
+
+import random
+
+import pytest
+
+from ai_in_loop.index import BM25Index
+
+
+CORPUS = [
+    "Python is a programming language with simple syntax.",
+    "Rust is a systems programming language focused on safety.",
+    "The python snake is found in Africa and Asia.",
+    "Gardening tips: water tomatoes in the morning.",
+    "Python and Rust can interoperate through native extensions.",
+]
+
+
+def build(texts, source="a.txt"):
+    return BM25Index.build(texts, [{"i": i} for i in range(len(texts))], [source] * len(texts))
+
+
+def search_texts(index, query, k=5):
+    return [index.texts[doc_id] for doc_id, _ in index.search(query, k)]
+
+
+class TestSearch:
+    """Tests for BM25Index.search."""
+
+    def test_scores_match_bm25_retriever(self):
+        """Test that scores equal rank-bm25's BM25Okapi scores."""
+        from rank_bm25 import BM25Okapi
+
+        index = build(CORPUS)
+        reference = BM25Okapi([text.split() for text in CORPUS])
+        expected = reference.get_scores("Python programming".split())
+
+        for doc_id, score in index.search("Python programming", 5):
+            assert score == pytest.approx(expected[doc_id])
+
+    def test_only_matching_documents_returned(self):
+        """Test that documents without query terms are not returned."""
+        results = search_texts(build(CORPUS), "tomatoes")
+        assert results == [CORPUS[3]]
+
+    def test_unknown_terms_return_nothing(self):
+        """Test that a query with no indexed terms returns no results."""
+        assert build(CORPUS).search("zebra", 3) == []
+
+    def test_respects_k(self):
+        """Test that at most k results are returned."""
+        assert len(build(CORPUS).search("Python Rust programming", 2)) == 2
+
+    def test_min_score_cutoff(self):
+        """Test that results below min_score are dropped by both backends."""
+        index = build(CORPUS)
+        all_hits = index.search("Python Rust programming", 5)
+        cutoff = all_hits[1][1]
+
+        assert index.search("Python Rust programming", 5, min_score=cutoff) == all_hits[:2]
+        assert index.matrix().search("Python Rust programming", 5, min_score=cutoff) == pytest.approx(all_hits[:2])
+
+
+class TestMaxScore:
+    """Tests that pruned top-k search matches exhaustive BM25 scoring."""
+
+    @pytest.fixture
+    def random_corpus(self):
+        rng = random.Random(7)
+        words = [f"w{i}" for i in range(300)]
+        weights = [1 / (i + 1) for i in range(300)]
+        texts = [" ".join(rng.choices(words, weights, k=rng.randint(10, 60))) for _ in range(2000)]
+        queries = [" ".join(rng.choices(words, weights, k=rng.randint(1, 5))) for _ in range(50)]
+        return texts, queries
+
+    def test_rankings_match_bm25_retriever(self, random_corpus):
+        """Test that top-k results match BM25Retriever on matching documents."""
+        from langchain_community.retrievers import BM25Retriever
+        from langchain_core.documents import Document
+
+        texts, queries = random_corpus
+        index = BM25Index.build(texts, [{}] * len(texts), ["a.txt"] * len(texts))
+        reference = BM25Retriever.from_documents(
+            [Document(page_content=t, metadata={"id": i}) for i, t in enumerate(texts)], k=10
+        )
+
+        for query in queries:
+            scores = reference.vectorizer.get_scores(query.split())
+            results = index.search(query, 10)
+            expected = sorted(range(len(texts)), key=lambda d: -scores[d])[:10]
+            assert [s for _, s in results] == pytest.approx([scores[d] for d in expected])
+            for doc_id, score in results:
+                assert score == pytest.approx(scores[doc_id])
+
+    def test_duplicate_query_terms_count_twice(self):
+        """Test that repeated query terms add their score once per occurrence."""
+        index = build(CORPUS)
+        single = dict(index.search("Python", 5))
+        double = dict(index.search("Python Python", 5))
+        for doc_id, score in single.items():
+            assert double[doc_id] == pytest.approx(2 * score)
+
+
+class TestMatrixBackend:
+    """Tests for the vectorized sparse-matrix scorer."""
+
+    def test_matches_postings_search(self):
+        """Test that matrix scoring returns the same results as MaxScore."""
+        index = build(CORPUS)
+        for query in ["Python", "Rust programming language", "water tomatoes", "zebra"]:
+            assert index.matrix().search(query, 3) == pytest.approx(index.search(query, 3))
+
+    def test_batch_matches_single_queries(self):
+        """Test that a query batch scores like individual queries."""
+        index = build(CORPUS)
+        queries = ["Python syntax", "safety", "snake Asia", "unknown"]
+        batch = index.matrix().search_batch(queries, 2)
+        assert batch == [index.matrix().search(query, 2) for query in queries]
+
+    def test_matrix_rebuilt_after_update(self):
+        """Test that the cached matrix is dropped when the index changes."""
+        index = BM25Index.build(CORPUS[:2], [{}] * 2, ["a.txt", "b.txt"])
+        assert index.matrix().search("tomatoes", 3) == []
+        index.update([], [CORPUS[3]], [{}], ["c.txt"])
+        assert [doc_id for doc_id, _ in index.matrix().search("tomatoes", 3)] == [2]
+
+
+class TestUpdate:
+    """Tests for incremental index updates."""
+
+    def test_update_matches_fresh_build(self):
+        """Test that removing and adding chunks gives the same scores as a rebuild."""
+        index = BM25Index.build(
+            CORPUS[:3], [{}] * 3, ["a.txt", "b.txt", "c.txt"]
+        )
+        index.update(["b.txt"], CORPUS[3:], [{}] * 2, ["d.txt", "e.txt"])
+
+        fresh = build([CORPUS[0], CORPUS[2], CORPUS[3], CORPUS[4]])
+        for query in ["Python", "Rust programming", "water the tomatoes"]:
+            assert index.search(query, 5) == pytest.approx(fresh.search(query, 5))
+
+    def test_removed_terms_are_pruned(self):
+        """Test that terms only found in removed chunks leave the vocabulary."""
+        index = BM25Index.build(CORPUS[:2], [{}] * 2, ["a.txt", "b.txt"])
+        index.update(["b.txt"], [], [], [])
+        assert "Rust" not in index.term_ids
+        assert index.search("Rust", 3) == []
+        assert len(index) == 1
+
+    def test_save_and_load_roundtrip(self, tmp_path):
+        """Test that a saved index loads with identical results."""
+        index = build(CORPUS)
+        index.save(tmp_path, {"key": 1})
+
+        loaded = BM25Index.load(tmp_path, {"key": 1})
+        assert loaded is not None
+        assert loaded.search("Python programming", 5) == index.search("Python programming", 5)
+        assert BM25Index.load(tmp_path, {"key": 2}) is None
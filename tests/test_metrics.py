@@ -0,0 +1,106 @@
+"""Tests for tool metrics."""
+
+import json
+
+from langchain_core.tools import tool
+import pytest
+
+from ai_in_loop.metrics import Histogram, MetricsRegistry, instrument_tool
+
+
+@pytest.fixture
+def echo():
+    """A tool that echoes its input and fails on request."""
+
+    @tool
+    def echo(text: str) -> str:
+        """Echo text."""
+        if text == "raise":
+            raise ValueError("boom")
+        if text == "bad":
+            return "Error: bad input"
+        return text
+
+    return echo
+
+
+class TestHistogram:
+    """Tests for Histogram."""
+
+    def test_buckets_are_cumulative(self):
+        """Test that each bucket counts observations at or below its bound."""
+        histogram = Histogram((1, 10))
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+        assert histogram.cumulative() == [("1", 2), ("10", 3), ("+Inf", 4)]
+        assert histogram.sum == 56.5
+
+
+class TestInstrumentTool:
+    """Tests for instrument_tool."""
+
+    def test_counts_calls_and_errors(self, echo):
+        """Test that error strings and exceptions both count as errors."""
+        registry = MetricsRegistry()
+        instrumented = instrument_tool(echo, registry)
+        instrumented.invoke({"text": "hello"})
+        instrumented.invoke({"text": "bad"})
+        with pytest.raises(ValueError):
+            instrumented.invoke({"text": "raise"})
+
+        stats = registry.snapshot()["echo"]
+        assert stats["calls"] == 3
+        assert stats["errors"] == 2
+        assert stats["error_rate"] == pytest.approx(2 / 3)
+
+    def test_records_payload_sizes(self, echo):
+        """Test that argument and result sizes are measured in bytes."""
+        registry = MetricsRegistry()
+        instrument_tool(echo, registry).invoke({"text": "é" * 10})
+
+        stats = registry.snapshot()["echo"]
+        assert stats["result_bytes_mean"] == 20
+        assert stats["args_bytes_mean"] == len(json.dumps({"text": "é" * 10}, ensure_ascii=False).encode())
+
+    def test_logs_calls_with_run_id(self, echo, tmp_path):
+        """Test that runs with a run_id log the call and its timed result."""
+        log_path = tmp_path / "runs.jsonl"
+        instrumented = instrument_tool(echo, MetricsRegistry(), log_path)
+        instrumented.invoke({"text": "hi"}, {"metadata": {"run_id": "r1"}})
+        instrumented.invoke({"text": "hi"})
+
+        events = [json.loads(line) for line in log_path.read_text().splitlines()]
+        assert [e["event"] for e in events] == ["tool_call", "tool_result"]
+        assert events[1]["result"] == "hi"
+        assert events[1]["elapsed_seconds"] >= 0
+
+
+class TestPrometheus:
+    """Tests for the Prometheus text dump."""
+
+    def test_exposition_format(self):
+        """Test counters and histogram series for a tool."""
+        registry = MetricsRegistry()
+        registry.observe_tool("calc", 0.002, False, 10, 100)
+        registry.observe_tool("calc", 0.2, True, 10, 100)
+        text = registry.to_prometheus()
+
+        assert "# TYPE ai_in_loop_tool_calls_total counter" in text
+        assert 'ai_in_loop_tool_calls_total{tool="calc"} 2' in text
+        assert 'ai_in_loop_tool_errors_total{tool="calc"} 1' in text
+        assert "# TYPE ai_in_loop_tool_latency_seconds histogram" in text
+        assert 'ai_in_loop_tool_latency_seconds_bucket{tool="calc",le="0.005"} 1' in text
+        assert 'ai_in_loop_tool_latency_seconds_bucket{tool="calc",le="+Inf"} 2' in text
+        assert 'ai_in_loop_tool_latency_seconds_count{tool="calc"} 2' in text
+        assert 'ai_in_loop_tool_result_bytes_sum{tool="calc"} 200.0' in text
+
+    def test_write_replaces_file(self, tmp_path):
+        """Test that the dump is written without leaving temporary files."""
+        registry = MetricsRegistry()
+        registry.observe_tool("calc", 0.01, False, 1, 1)
+        path = tmp_path / "metrics" / "tools.prom"
+        registry.write_prometheus(path)
+        registry.write_prometheus(path)
+
+        assert path.read_text() == registry.to_prometheus()
+        assert [p.name for p in path.parent.iterdir()] == ["tools.prom"]
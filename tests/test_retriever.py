@@ -1,5 +1,6 @@
 """Tests for document retrieval functionality."""
 
+import asyncio
 import pytest
 import tempfile
 from pathlib import Path
@@ -155,6 +156,14 @@ class TestSearchDocsTool:
         assert "No documents available" not in result
         assert "Source:" in result
 
+    def test_async_search_matches_sync(self, config_with_docs):
+        """Test that ainvoke returns the same passages as invoke."""
+        reset_retriever()
+        set_search_config(config_with_docs)
+        result = asyncio.run(search_docs.ainvoke({"query": "Python syntax"}))
+        assert "Source:" in result
+        assert result == search_docs.invoke({"query": "Python syntax"})
+
     def test_search_empty_directory(self, config_empty_dir):
         """Test that search handles empty directory gracefully."""
         reset_retriever()  # Reset to force re-initialization
@@ -180,3 +189,333 @@ class TestResetRetriever:
         assert retriever2 is not None
         # Note: They might be equal in content but are different instances
         # after reset due to re-initialization
+
+
+class TestIndexCache:
+    """Tests for the persisted BM25 index."""
+
+    def test_index_written_to_cache(self, config_with_docs):
+        """Test that building the retriever persists the index."""
+        get_retriever(config_with_docs)
+        cache_dir = Path(config_with_docs.resources_dir) / ".index" / "bm25-1000-100"
+        assert (cache_dir / "manifest.json").exists()
+
+    def test_cached_index_is_reused(self, config_with_docs, monkeypatch):
+        """Test that an unchanged corpus is loaded without rebuilding."""
+        get_retriever(config_with_docs)
+        reset_retriever()
+
+        from ai_in_loop import retriever as retriever_module
+
+        def fail_load(*args, **kwargs):
+            raise AssertionError("index should be loaded from cache")
+
+        monkeypatch.setattr(retriever_module, "_load_file", fail_load)
+        retriever = get_retriever(config_with_docs)
+        results = retriever.invoke("Python programming")
+        assert "Python" in results[0].page_content
+
+    def test_changed_corpus_rebuilds_index(self, config_with_docs):
+        """Test that adding a document invalidates the cached index."""
+        get_retriever(config_with_docs)
+        reset_retriever()
+
+        new_file = Path(config_with_docs.resources_dir) / "rust.txt"
+        new_file.write_text("Rust is a systems programming language focused on safety.")
+
+        retriever = get_retriever(config_with_docs)
+        results = retriever.invoke("Rust safety")
+        assert any("Rust" in doc.page_content for doc in results)
+
+
+class TestIncrementalIndexing:
+    """Tests for refreshing the index when documents change."""
+
+    def test_refresh_picks_up_new_file(self, config_with_docs):
+        """Test that refresh_retriever indexes a newly added document."""
+        from ai_in_loop.retriever import refresh_retriever
+
+        get_retriever(config_with_docs)
+        (Path(config_with_docs.resources_dir) / "garden.txt").write_text("Water tomatoes every morning.")
+
+        retriever = refresh_retriever(config_with_docs)
+        results = retriever.invoke("tomatoes")
+        assert results and "tomatoes" in results[0].page_content
+
+    def test_refresh_drops_deleted_file(self, config_with_docs):
+        """Test that chunks of a deleted document are removed."""
+        from ai_in_loop.retriever import refresh_retriever
+
+        extra = Path(config_with_docs.resources_dir) / "garden.txt"
+        extra.write_text("Water tomatoes every morning.")
+        get_retriever(config_with_docs)
+        extra.unlink()
+
+        retriever = refresh_retriever(config_with_docs)
+        assert retriever.invoke("tomatoes") == []
+
+    def test_only_changed_files_are_reloaded(self, config_with_docs, monkeypatch):
+        """Test that unchanged documents are not re-read on startup."""
+        from ai_in_loop import retriever as retriever_module
+
+        get_retriever(config_with_docs)
+        reset_retriever()
+        new_file = Path(config_with_docs.resources_dir) / "garden.txt"
+        new_file.write_text("Water tomatoes every morning.")
+
+        loaded = []
+        original_load_file = retriever_module._load_file
+
+        def tracking_load_file(path):
+            loaded.append(path.name)
+            return original_load_file(path)
+
+        monkeypatch.setattr(retriever_module, "_load_file", tracking_load_file)
+        get_retriever(config_with_docs)
+        assert loaded == ["garden.txt"]
+
+
+class TestParallelIngest:
+    """Tests for loading documents with a process pool."""
+
+    def test_parallel_ingest_matches_serial(self, temp_resources_dir):
+        """Test that parallel ingest produces the same chunks in the same order."""
+        from dataclasses import replace
+
+        for i in range(4):
+            (Path(temp_resources_dir) / f"doc{i}.txt").write_text(f"Document {i} about topic{i}. " * 50)
+
+        serial_cfg = Config(
+            use_gemini=False,
+            gemini_api_key=None,
+            gemini_model="gemini-2.5-flash",
+            temperature=0.7,
+            thinking_level=None,
+            thinking_budget=0,
+            system_prompt_file="prompts/empty.md",
+            resources_dir=temp_resources_dir,
+            chunk_size=200,
+            chunk_overlap=20,
+            index_cache_dir=str(Path(temp_resources_dir) / ".serial"),
+        )
+        parallel_cfg = replace(
+            serial_cfg, ingest_workers=3, index_cache_dir=str(Path(temp_resources_dir) / ".parallel")
+        )
+
+        serial = get_retriever(serial_cfg).index
+        reset_retriever()
+        parallel = get_retriever(parallel_cfg).index
+
+        assert list(parallel.texts) == list(serial.texts)
+        assert list(parallel.sources) == list(serial.sources)
+
+
+
+class TestStreamingChunker:
+    """Tests for chunking files as a stream of blocks."""
+
+    PARAGRAPHS = "\n\n".join(f"Paragraph {i} talks about topic{i % 7} in some detail." * 3 for i in range(60))
+
+    def test_single_block_matches_splitter(self):
+        """Test that a file read in one block is chunked exactly like split_text."""
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from ai_in_loop.retriever import _split_stream
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=20)
+        chunks = [text for text, _ in _split_stream([(self.PARAGRAPHS, {"source": "a"})], splitter)]
+        assert chunks == splitter.split_text(self.PARAGRAPHS)
+
+    def test_small_blocks_respect_chunk_size(self):
+        """Test that chunks stay within chunk_size and cover the whole text."""
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from ai_in_loop.retriever import _split_stream
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0)
+        blocks = [(self.PARAGRAPHS[i:i + 64], {"source": "a"}) for i in range(0, len(self.PARAGRAPHS), 64)]
+        chunks = [text for text, _ in _split_stream(blocks, splitter)]
+
+        assert all(len(chunk) <= 200 for chunk in chunks)
+        assert "".join(chunks).split() == "".join(self.PARAGRAPHS.split("\n\n")).split()
+
+    def test_chunks_emitted_before_input_is_exhausted(self):
+        """Test that the chunker consumes its input lazily."""
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from ai_in_loop.retriever import _split_stream
+
+        consumed = []
+
+        def blocks():
+            for i in range(1000):
+                consumed.append(i)
+                yield f"Sentence number {i} of an endless stream. ", {"source": "a"}
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=10)
+        next(_split_stream(blocks(), splitter))
+        assert len(consumed) < 10
+
+    def test_file_failing_midway_is_dropped(self, config_with_docs, monkeypatch):
+        """Test that chunks of a file that fails part-way are not indexed."""
+        from ai_in_loop import retriever as retriever_module
+
+        (Path(config_with_docs.resources_dir) / "broken.txt").write_text("Broken tomatoes.")
+        original_load_file = retriever_module._load_file
+
+        def failing_load_file(path):
+            yield from original_load_file(path)
+            if path.name == "broken.txt":
+                raise OSError("read error")
+
+        monkeypatch.setattr(retriever_module, "_load_file", failing_load_file)
+        retriever = get_retriever(config_with_docs)
+        assert retriever.invoke("tomatoes") == []
+        assert "broken.txt" not in retriever.index.files
+
+class TestSearchBackends:
+    """Tests for selecting the scoring backend."""
+
+    def test_matrix_backend_search_many(self, config_with_docs):
+        """Test that the matrix backend answers batched queries."""
+        from dataclasses import replace
+
+        retriever = get_retriever(replace(config_with_docs, search_backend="matrix"))
+        results = retriever.search_many(["Python syntax", "nonexistentword"])
+        assert len(results) == 2
+        assert "Python" in results[0][0].page_content
+        assert results[1] == []
+
+
+class TestMappedIndex:
+    """Tests for serving chunks from the memory-mapped index."""
+
+    def test_loaded_index_is_memory_mapped(self, config_with_docs):
+        """Test that the retriever serves chunk text from the mapped store."""
+        from ai_in_loop.chunk_store import MappedStrings
+
+        retriever = get_retriever(config_with_docs)
+        assert isinstance(retriever.index.texts, MappedStrings)
+        assert "Python" in retriever.invoke("Python")[0].page_content
+
+
+class TestQueryCache:
+    """Tests for caching search results."""
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        from ai_in_loop.retriever import QueryCache
+
+        cache = QueryCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        """Test that entries older than the TTL are treated as misses."""
+        from ai_in_loop import retriever as retriever_module
+
+        now = [100.0]
+        monkeypatch.setattr(retriever_module.time, "monotonic", lambda: now[0])
+        cache = retriever_module.QueryCache(maxsize=10, ttl=5)
+        cache.put("a", 1)
+        now[0] += 10
+
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_repeated_query_hits_cache(self, config_with_docs):
+        """Test that a repeated (whitespace-normalized) query is a cache hit."""
+        from ai_in_loop.retriever import query_cache_stats, search_documents
+
+        first = search_documents(config_with_docs, "Python syntax")
+        before = query_cache_stats()
+        second = search_documents(config_with_docs, "  Python   syntax ")
+        after = query_cache_stats()
+
+        assert [d.page_content for d in first] == [d.page_content for d in second]
+        assert after["hits"] == before["hits"] + 1
+
+    def test_refresh_invalidates_cache(self, config_with_docs):
+        """Test that results are recomputed after the corpus changes."""
+        from ai_in_loop.retriever import refresh_retriever, search_documents
+
+        assert search_documents(config_with_docs, "tomatoes") == []
+        (Path(config_with_docs.resources_dir) / "garden.txt").write_text("Water tomatoes every morning.")
+        refresh_retriever(config_with_docs)
+
+        assert search_documents(config_with_docs, "tomatoes")
+
+
+class TestSearchLimits:
+    """Tests for k, min_score and max_chars limits."""
+
+    @pytest.fixture
+    def multi_doc_config(self, config_with_docs):
+        for i in range(5):
+            (Path(config_with_docs.resources_dir) / f"lang{i}.txt").write_text(
+                f"Python tip number {i}: " + "write readable code. " * (i + 1)
+            )
+        return config_with_docs
+
+    def test_k_from_config(self, multi_doc_config):
+        """Test that search_k controls how many chunks are returned."""
+        from dataclasses import replace
+        from ai_in_loop.retriever import search_documents
+
+        results = search_documents(replace(multi_doc_config, search_k=5), "Python")
+        assert len(results) == 5
+
+    def test_per_call_overrides(self, multi_doc_config):
+        """Test that per-call k overrides the configured value."""
+        from ai_in_loop.retriever import search_documents
+
+        assert len(search_documents(multi_doc_config, "Python", k=1)) == 1
+
+    def test_max_chars_budget(self, multi_doc_config):
+        """Test that returned chunks fit in the character budget."""
+        from ai_in_loop.retriever import search_documents
+
+        results = search_documents(multi_doc_config, "Python", k=5, max_chars=120)
+        assert results
+        assert sum(len(doc.page_content) for doc in results) <= 120
+
+    def test_first_chunk_truncated_to_budget(self, multi_doc_config):
+        """Test that a single oversized chunk is cut to the budget."""
+        from ai_in_loop.retriever import search_documents
+
+        results = search_documents(multi_doc_config, "Python", max_chars=10)
+        assert len(results) == 1
+        assert len(results[0].page_content) == 10
+
+    def test_tool_rejects_invalid_k(self, multi_doc_config):
+        """Test that search_docs validates per-call k."""
+        set_search_config(multi_doc_config)
+        assert "Error" in search_docs.invoke({"query": "Python", "k": 0})
+        assert search_docs.invoke({"query": "Python", "k": 1}).count("Source:") == 1
+
+
+class TestHybridSearch:
+    """Tests for hybrid BM25 + dense retrieval."""
+
+    def test_paraphrase_found_by_dense_path(self, config_with_docs):
+        """Test that a query with no exact keyword match still finds the document."""
+        from dataclasses import replace
+        from ai_in_loop.retriever import search_documents
+
+        assert search_documents(config_with_docs, "programmers") == []
+        reset_retriever()
+
+        hybrid_cfg = replace(config_with_docs, dense_embedder="hashing")
+        results = search_documents(hybrid_cfg, "programmers")
+        assert results and "Python" in results[0].page_content
+
+    def test_dense_index_persisted_next_to_bm25(self, config_with_docs):
+        """Test that the vector index is saved in the cache directory."""
+        from dataclasses import replace
+
+        get_retriever(replace(config_with_docs, dense_embedder="hashing"))
+        cache_dir = Path(config_with_docs.resources_dir) / ".index" / "bm25-1000-100"
+        assert (cache_dir / "dense-hashing-256" / "manifest.json").exists()
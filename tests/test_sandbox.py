@@ -0,0 +1,54 @@
+"""Tests for the worker process pool."""
+
+import math
+import os
+import time
+
+import pytest
+
+from ai_in_loop.sandbox import WorkerCrashedError, WorkerPool
+
+
+@pytest.fixture
+def pool():
+    """A one-worker pool with a short timeout."""
+    pool = WorkerPool(1, timeout=1.0, max_jobs_per_worker=3)
+    yield pool
+    pool.close()
+
+
+class TestWorkerPool:
+    """Tests for WorkerPool."""
+
+    def test_runs_job_in_another_process(self, pool):
+        """Test that jobs run outside the calling process."""
+        assert pool.run(os.getpid) != os.getpid()
+        assert pool.run(math.comb, 10, 3) == 120
+
+    def test_job_exception_is_reraised(self, pool):
+        """Test that an exception raised by the job reaches the caller."""
+        with pytest.raises(ValueError):
+            pool.run(math.sqrt, -1)
+        assert pool.run(math.sqrt, 4) == 2.0
+
+    def test_timeout_kills_and_replaces_worker(self, pool):
+        """Test that an overrunning job is stopped and the pool recovers."""
+        pid = pool.run(os.getpid)
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            pool.run(time.sleep, 30)
+        assert time.monotonic() - start < 5
+        assert pool.size() == 1
+        assert pool.run(os.getpid) != pid
+
+    def test_crashed_worker_is_replaced(self, pool):
+        """Test that a worker dying mid-job is reported and replaced."""
+        with pytest.raises(WorkerCrashedError):
+            pool.run(os._exit, 1)
+        assert pool.run(math.factorial, 5) == 120
+
+    def test_workers_recycled_after_max_jobs(self, pool):
+        """Test that a worker is replaced after max_jobs_per_worker jobs."""
+        pids = [pool.run(os.getpid) for _ in range(4)]
+        assert len(set(pids[:3])) == 1
+        assert pids[3] != pids[0]
@@ -0,0 +1,125 @@
+"""Tests for tool result memoization."""
+
+import asyncio
+import json
+
+from langchain_core.tools import tool
+import pytest
+
+from ai_in_loop.tool_cache import ToolCache, canonical_args, memoize_tool
+
+
+@pytest.fixture
+def counted():
+    """A tool that records its calls and fails for negative input."""
+    calls = []
+
+    @tool
+    def square(x: int, offset: int = 0) -> str:
+        """Square a number."""
+        calls.append(x)
+        if x < 0:
+            return "Error: negative input"
+        return str(x * x + offset)
+
+    return square, calls
+
+
+class TestToolCache:
+    """Tests for the ToolCache LRU."""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest unused entry is evicted first."""
+        cache = ToolCache(maxsize=2)
+        cache.put(("a", "1", None), "A")
+        cache.put(("b", "1", None), "B")
+        cache.get(("a", "1", None))
+        cache.put(("c", "1", None), "C")
+        assert cache.get(("b", "1", None)) is None
+        assert cache.get(("a", "1", None)) == "A"
+
+    def test_invalidate_one_tool(self):
+        """Test that invalidation can target a single tool."""
+        cache = ToolCache()
+        cache.put(("a", "1", None), "A")
+        cache.put(("b", "1", None), "B")
+        cache.invalidate("a")
+        assert cache.get(("a", "1", None)) is None
+        assert cache.get(("b", "1", None)) == "B"
+
+    def test_size_zero_disables(self):
+        """Test that maxsize 0 stores nothing."""
+        cache = ToolCache()
+        cache.put(("a", "1", None), "A")
+        cache.configure(0)
+        cache.put(("b", "1", None), "B")
+        assert cache.stats()["size"] == 0
+
+
+class TestMemoizeTool:
+    """Tests for memoize_tool."""
+
+    def test_canonical_args_fill_defaults(self, counted):
+        """Test that omitted defaults and key order do not change the key."""
+        square, _ = counted
+        assert canonical_args(square, {"x": 3}) == canonical_args(square, {"offset": 0, "x": 3})
+
+    def test_repeated_call_served_from_cache(self, counted):
+        """Test that the tool runs once for equivalent calls."""
+        square, calls = counted
+        memoized = memoize_tool(square, ToolCache())
+        assert memoized.invoke({"x": 3}) == "9"
+        assert memoized.invoke({"x": 3, "offset": 0}) == "9"
+        assert memoized.invoke({"x": 3, "offset": 1}) == "10"
+        assert calls == [3, 3]
+
+    def test_async_calls_share_the_cache(self, counted):
+        """Test that ainvoke is answered from results cached by invoke."""
+        square, calls = counted
+        memoized = memoize_tool(square, ToolCache())
+        memoized.invoke({"x": 4})
+        assert asyncio.run(memoized.ainvoke({"x": 4})) == "16"
+        assert asyncio.run(memoized.ainvoke({"x": 5})) == "25"
+        assert calls == [4, 5]
+
+    def test_keeps_tool_interface(self, counted):
+        """Test that the wrapper can stand in for the tool."""
+        square, _ = counted
+        memoized = memoize_tool(square, ToolCache())
+        assert memoized.name == square.name
+        assert memoized.description == square.description
+        assert memoized.args == square.args
+
+    def test_errors_not_cached(self, counted):
+        """Test that error results are recomputed."""
+        square, calls = counted
+        memoized = memoize_tool(square, ToolCache())
+        memoized.invoke({"x": -1})
+        memoized.invoke({"x": -1})
+        assert calls == [-1, -1]
+
+    def test_version_change_invalidates(self, counted):
+        """Test that results from an older version are not returned."""
+        square, calls = counted
+        version = [1]
+        memoized = memoize_tool(square, ToolCache(), version=lambda: version[0])
+        memoized.invoke({"x": 2})
+        version[0] = 2
+        memoized.invoke({"x": 2})
+        memoized.invoke({"x": 2})
+        assert calls == [2, 2]
+
+    def test_hits_logged_with_run_id(self, counted, tmp_path):
+        """Test that cache hits are logged for runs with a run_id."""
+        square, _ = counted
+        log_path = tmp_path / "runs.jsonl"
+        memoized = memoize_tool(square, ToolCache(), log_path=log_path)
+        memoized.invoke({"x": 4})
+        memoized.invoke({"x": 4})
+        assert not log_path.exists()  # no run_id, nothing logged
+
+        memoized.invoke({"x": 4}, config={"metadata": {"run_id": "run-1"}})
+        [event] = [json.loads(line) for line in log_path.read_text().splitlines()]
+        assert event["event"] == "tool_cache_hit"
+        assert event["run_id"] == "run-1"
+        assert event["tool_name"] == "square"
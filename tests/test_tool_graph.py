@@ -7,11 +7,18 @@ These tests are designed to be extension-tolerant: they validate that
 the core framework works while allowing students to add new tools.
 """
 
+import asyncio
+import threading
+import time
+
 import pytest
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool, tool
+from langgraph.graph import START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
 
 from ai_in_loop.config import Config
-from ai_in_loop.graph import build_app, run_once
+from ai_in_loop.graph import _limit_concurrency, arun_once, build_app, build_tool_node, run_once, tool_cache_stats, tool_metrics
 
 
 @pytest.fixture
@@ -118,6 +125,25 @@ class TestGraphWithToolCalls:
             assert "100" in str(tool_messages[0].content)
 
 
+    def test_repeated_tool_call_uses_cache(self, mock_config):
+        """Test that an identical tool call is answered from the tool cache."""
+        app = build_app(mock_config)
+        app.invoke({"messages": [HumanMessage(content="Calculate 17 * 23")]})
+        hits = tool_cache_stats()["hits"]
+
+        result = app.invoke({"messages": [HumanMessage(content="Calculate 17 * 23")]})
+        tool_messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+        assert tool_messages[0].content == "391"
+        assert tool_cache_stats()["hits"] == hits + 1
+
+    def test_tool_calls_are_measured(self, mock_config):
+        """Test that tool calls made by the graph are recorded in the metrics."""
+        app = build_app(mock_config)
+        calls = tool_metrics().snapshot().get("python_calc", {}).get("calls", 0)
+        app.invoke({"messages": [HumanMessage(content="Calculate 6 * 7")]})
+        assert tool_metrics().snapshot()["python_calc"]["calls"] == calls + 1
+
+
 class TestGraphMessageFlow:
     """Tests for message flow through the graph."""
 
@@ -169,3 +195,94 @@ class TestGraphWithValidation:
             assert isinstance(tool_messages[0].content, str)
             # Should contain "12" (sqrt of 144)
             assert "12" in tool_messages[0].content
+
+
+def _run_tools(node, calls):
+    """Run a tools node on one AI message carrying calls; return its ToolMessages."""
+    graph = StateGraph(MessagesState)
+    graph.add_node("tools", node)
+    graph.add_edge(START, "tools")
+    result = graph.compile().invoke({"messages": [AIMessage(content="", tool_calls=calls)]})
+    return result["messages"][1:]
+
+
+class TestParallelToolCalls:
+    """Tests for executing several tool calls from one AI message."""
+
+    def test_results_keep_call_order(self, mock_config):
+        """Each ToolMessage answers the tool call at the same position."""
+        node = build_tool_node(mock_config)
+        calls = [
+            {"name": "python_calc", "args": {"expression": f"{n} * 11"}, "id": f"call_{n}", "type": "tool_call"}
+            for n in (3, 1, 2)
+        ]
+        messages = _run_tools(node, calls)
+
+        assert [m.tool_call_id for m in messages] == ["call_3", "call_1", "call_2"]
+        assert [m.content for m in messages] == ["33", "11", "22"]
+
+    def test_concurrency_is_bounded_per_tool(self):
+        """No more than the limit of calls to one tool run at the same time."""
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        @tool
+        def slow(n: int) -> str:
+            """Sleep briefly and echo n."""
+            with lock:
+                running.append(n)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(n)
+            return str(n)
+
+        node = ToolNode([_limit_concurrency(slow, 2)])
+        calls = [{"name": "slow", "args": {"n": n}, "id": f"call_{n}", "type": "tool_call"} for n in range(6)]
+        messages = _run_tools(node, calls)
+
+        assert [m.content for m in messages] == [str(n) for n in range(6)]
+        assert max(peak) == 2
+
+
+class TestAsyncGraph:
+    """Tests for running the graph on an event loop."""
+
+    def test_arun_once_with_math(self, mock_config):
+        """Test that arun_once runs the tool loop like run_once."""
+        response = asyncio.run(arun_once("Calculate 5 + 3", mock_config))
+        assert response == run_once("Calculate 5 + 3", mock_config)
+        assert "8" in response
+
+    def test_concurrent_conversations(self, mock_config):
+        """Test that many conversations can share one event loop."""
+        async def main():
+            return await asyncio.gather(*(arun_once(f"Calculate {n} * 2", mock_config) for n in range(20)))
+
+        responses = asyncio.run(main())
+        assert [str(n * 2) in r for n, r in enumerate(responses)] == [True] * 20
+
+    def test_async_concurrency_is_bounded(self):
+        """Test that the per-tool bound also holds for ainvoke."""
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        async def slow_async(n: int) -> str:
+            with lock:
+                running.append(n)
+                peak.append(len(running))
+            await asyncio.sleep(0.02)
+            with lock:
+                running.remove(n)
+            return str(n)
+
+        slow = StructuredTool.from_function(coroutine=slow_async, name="slow", description="Sleep briefly and echo n.")
+        limited = _limit_concurrency(slow, 2)
+
+        async def main():
+            return await asyncio.gather(*(limited.ainvoke({"n": n}) for n in range(6)))
+
+        assert asyncio.run(main()) == [str(n) for n in range(6)]
+        assert max(peak) == 2
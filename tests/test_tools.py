@@ -5,9 +5,21 @@ to ensure correct behavior for valid expressions and proper
 rejection of unsafe operations.
 """
 
+from dataclasses import replace
+from decimal import Decimal
+from fractions import Fraction
+
 import pytest
 
-from ai_in_loop.tools import python_calc, safe_eval, SafeEvalError
+from ai_in_loop.config import Config
+from ai_in_loop.tools import (
+    compiled_cache_stats,
+    python_calc,
+    python_calc_batch,
+    safe_eval,
+    SafeEvalError,
+    set_calc_config,
+)
 
 
 class TestSafeEval:
@@ -129,6 +141,240 @@ class TestSafeEval:
             safe_eval("(lambda x: x)(5)")
 
 
+
+class TestCompiledCache:
+    """Tests for caching compiled expressions."""
+
+    def test_repeated_expression_hits_cache(self):
+        """Test that evaluating the same expression twice reuses the compiled form."""
+        safe_eval("sqrt(81) + 0.25")
+        before = compiled_cache_stats()
+        assert safe_eval("sqrt(81) + 0.25") == 9.25
+        after = compiled_cache_stats()
+        assert after["hits"] == before["hits"] + 1
+        assert after["misses"] == before["misses"]
+
+    def test_same_template_different_numbers(self):
+        """Test that expressions differing only in numbers share a cache entry."""
+        assert safe_eval("comb(10, 3) * 1.5") == 180.0
+        before = compiled_cache_stats()
+        assert safe_eval("comb(6, 2) * 2") == 30
+        assert compiled_cache_stats()["hits"] == before["hits"] + 1
+
+    def test_template_keeps_literal_types(self):
+        """Test that int and float literals keep their types on a template hit."""
+        assert safe_eval("7 // 2") == 3
+        assert isinstance(safe_eval("7 // 2"), int)
+        assert safe_eval("7.0 // 2") == 3.0
+        assert isinstance(safe_eval("7.0 // 2"), float)
+
+    def test_invalid_literals_still_rejected(self):
+        """Test that a cached template does not accept invalid number literals."""
+        safe_eval("1 + 1")
+        with pytest.raises(SafeEvalError, match="Invalid syntax"):
+            safe_eval("01 + 1")
+
+    def test_errors_are_not_cached(self):
+        """Test that invalid expressions are rejected every time."""
+        for _ in range(2):
+            with pytest.raises(SafeEvalError, match="Unknown variable"):
+                safe_eval("y * 3")
+
+    def test_stats_report_hit_rate(self):
+        """Test that the hit rate is derived from hits and misses."""
+        stats = compiled_cache_stats()
+        lookups = stats["hits"] + stats["misses"]
+        assert stats["hit_rate"] == pytest.approx(stats["hits"] / lookups)
+        assert stats["size"] <= stats["maxsize"]
+
+
+class TestLongExpressions:
+    """Tests for expressions too long or deep for recursive evaluation."""
+
+    def test_long_sum(self):
+        """Test a chain with far more terms than the recursion limit."""
+        assert safe_eval("+".join(["1"] * 10_000)) == 10_000
+
+    def test_long_chain_of_subexpressions(self):
+        """Test a chain whose operands are not plain numbers."""
+        assert safe_eval(" - ".join(["2 * 3"] * 2000)) == 6 - 6 * 1999
+
+    def test_deep_unary_and_power_chains(self):
+        """Test right-nested chains that ast.parse cannot handle."""
+        assert safe_eval("-" * 5001 + "2") == -2
+        assert safe_eval(" ** ".join(["1"] * 5000)) == 1
+
+    @pytest.mark.parametrize("expression", [
+        "-2 ** 2 + 2 ** 3 ** 2 - 2 ** -1",
+        "(1 < 2 < 3) + (1 < 2) < 3 + (3 > 2 > 2)",
+        "max([1, 5, 2],) * min((4, 3)) // 2 % 7",
+        "sqrt(16) * 3 + sin(pi / 2) - 1e3 / 1_000",
+    ])
+    def test_deep_expressions_keep_precedence(self, expression):
+        """Test that very long expressions parse like short ones."""
+        padding = "0 + " * 5000
+        assert safe_eval(padding + expression) == safe_eval(expression)
+
+    def test_deep_expression_errors(self):
+        """Test that very long expressions are still validated."""
+        with pytest.raises(SafeEvalError, match="Unknown variable: y"):
+            safe_eval("+".join(["1"] * 5000) + " + y")
+        with pytest.raises(SafeEvalError, match="Invalid syntax"):
+            safe_eval("+".join(["1"] * 5000) + " +")
+        with pytest.raises(SafeEvalError, match="unsupported token 'if'"):
+            safe_eval("+".join(["1"] * 5000) + " + (1 if 1 else 2)")
+
+    def test_long_batch_expression(self):
+        """Test a long chain in vectorized mode."""
+        result = python_calc_batch.invoke({
+            "expression": "+".join(["x"] * 5000),
+            "variables": {"x": [1, 2]},
+        })
+        assert result == "0: 5000\n1: 10000"
+
+
+class TestArithmeticModes:
+    """Tests for the decimal and fraction modes of safe_eval."""
+
+    def test_decimal_literals_are_exact(self):
+        """Test that decimal mode avoids binary rounding errors."""
+        assert safe_eval("0.1 + 0.2", mode="decimal") == Decimal("0.3")
+        assert safe_eval("round(2.675, 2)", mode="decimal") == Decimal("2.68")
+        assert safe_eval("0.1 + 0.2") == 0.1 + 0.2  # float mode is unchanged
+
+    def test_decimal_precision_per_call(self):
+        """Test that precision sets the significant digits of a call."""
+        assert safe_eval("1 / 3", mode="decimal", precision=5) == Decimal("0.33333")
+        assert str(safe_eval("1 / 3", mode="decimal")) == "0." + "3" * 28
+        assert str(safe_eval("pi", mode="decimal", precision=30)) == "3.14159265358979323846264338328"
+        assert str(safe_eval("sqrt(2)", mode="decimal", precision=20)) == "1.4142135623730950488"
+
+    def test_decimal_functions(self):
+        """Test logarithms and integer functions on decimals."""
+        assert safe_eval("log2(8)", mode="decimal") == 3
+        assert safe_eval("factorial(5) * 1.5", mode="decimal") == Decimal("180")
+        assert safe_eval("floor(2.5) + ceil(2.5)", mode="decimal") == 5
+
+    def test_fractions_are_exact(self):
+        """Test rational arithmetic in fraction mode."""
+        assert safe_eval("1/3 + 1/6", mode="fraction") == Fraction(1, 2)
+        assert safe_eval("2 ** -2 * 0.5", mode="fraction") == Fraction(1, 8)
+        assert safe_eval("comb(10, 3) / 4", mode="fraction") == 30
+
+    @pytest.mark.parametrize("expression,mode,message", [
+        ("2 ** 0.5", "fraction", "Non-integer powers"),
+        ("sqrt(2)", "fraction", "not available"),
+        ("pi", "fraction", "not available"),
+        ("sin(1)", "decimal", "not available"),
+        ("(1/3) ** 100000", "fraction", "Result too large"),
+    ])
+    def test_unavailable_or_oversized(self, expression, mode, message):
+        """Test operations whose result cannot be exact or is too large."""
+        with pytest.raises(SafeEvalError, match=message):
+            safe_eval(expression, mode=mode)
+
+    def test_invalid_mode_or_precision(self):
+        """Test that mode and precision are validated."""
+        with pytest.raises(SafeEvalError, match="Unknown mode"):
+            safe_eval("1", mode="exact")
+        with pytest.raises(SafeEvalError, match="only applies"):
+            safe_eval("1", precision=10)
+        with pytest.raises(SafeEvalError, match="between 1 and"):
+            safe_eval("1", mode="decimal", precision=0)
+
+
+class TestStatistics:
+    """Tests for the statistics functions on lists."""
+
+    def test_float_statistics(self):
+        """Test central tendency, spread and percentiles."""
+        assert safe_eval("mean([1, 2, 3, 4])") == 2.5
+        assert safe_eval("median([3, 1, 2])") == 2
+        assert safe_eval("variance([1, 2, 3, 4])") == pytest.approx(5 / 3)
+        assert safe_eval("stdev([2, 4, 4, 4, 5, 5, 7, 9])") == pytest.approx(2.138, abs=1e-3)
+        assert safe_eval("percentile([1, 2, 3, 4], 25)") == 1.75
+        assert safe_eval("percentile([5, 1, 3], 100)") == 5
+
+    def test_cumulative(self):
+        """Test running sums and products, which can feed other functions."""
+        assert safe_eval("cumsum([1, 2, 3])") == [1, 3, 6]
+        assert safe_eval("cumprod([1.5, 2, 3])") == [1.5, 3, 9]
+        assert safe_eval("min(cumsum([5, -7, 4, -3]))") == -2
+
+    def test_large_list(self):
+        """Test reducing a 100k-element list in one expression."""
+        expression = "mean([" + ", ".join(str(i) for i in range(100_000)) + "])"
+        assert safe_eval(expression) == 49999.5
+
+    def test_exact_modes(self):
+        """Test that statistics keep the number type of exact modes."""
+        assert safe_eval("mean([0.1, 0.2])", mode="decimal") == Decimal("0.15")
+        assert safe_eval("variance([1, 2, 3, 4])", mode="fraction") == Fraction(5, 3)
+        assert safe_eval("percentile([1, 2, 3, 4], 25)", mode="fraction") == Fraction(7, 4)
+        assert safe_eval("cumsum([0.1, 0.2])", mode="decimal") == [Decimal("0.1"), Decimal("0.3")]
+
+    @pytest.mark.parametrize("expression,message", [
+        ("mean([])", "non-empty"),
+        ("stdev([1])", "at least two"),
+        ("percentile([1, 2], 101)", "between 0 and 100"),
+    ])
+    def test_invalid_input(self, expression, message):
+        """Test errors for empty lists and out-of-range percentiles."""
+        with pytest.raises(ValueError, match=message):
+            safe_eval(expression)
+
+    def test_batch_statistics_per_element(self):
+        """Test that batches compute a statistic across a list per element."""
+        result = python_calc_batch.invoke({
+            "expression": "mean([x, y, 6])",
+            "variables": {"x": [0, 3], "y": [3, 6]},
+        })
+        assert result == "0: 3\n1: 5"
+        result = python_calc_batch.invoke({"expression": "cumsum([x])", "variables": {"x": [1]}})
+        assert "not available" in result
+
+
+class TestResourceGuards:
+    """Tests for the CPU and memory limits of safe_eval."""
+
+    @pytest.mark.parametrize("expression", [
+        "9 ** 9 ** 9",
+        "factorial(10 ** 7)",
+        "comb(10 ** 7, 5 * 10 ** 6)",
+        "perm(10 ** 6)",
+        "(2 ** 13000) * (2 ** 13000)",
+    ])
+    def test_huge_results_refused_before_computing(self, expression):
+        """Test that oversized integer results are rejected up front."""
+        with pytest.raises(SafeEvalError, match="Result too large"):
+            safe_eval(expression)
+
+    def test_results_within_limit_still_computed(self):
+        """Test that large but bounded results are computed exactly."""
+        assert safe_eval("2 ** 13000") == 2 ** 13000
+        assert safe_eval("comb(3000, 1500)") > 10 ** 900
+        assert safe_eval("comb(10 ** 20, 3)") == (10 ** 20) * (10 ** 20 - 1) * (10 ** 20 - 2) // 6
+
+    def test_list_repetition_capped(self):
+        """Test that list repetition cannot allocate huge lists."""
+        with pytest.raises(SafeEvalError, match="lists are limited"):
+            safe_eval("sum([1] * 10 ** 9)")
+
+    def test_round_ndigits_capped(self):
+        """Test that round() cannot be used to build huge powers of ten."""
+        with pytest.raises(SafeEvalError, match="ndigits"):
+            safe_eval("round(5, -10 ** 8)")
+
+    def test_timeout(self):
+        """Test that evaluation stops once the deadline has passed."""
+        with pytest.raises(SafeEvalError, match="timed out"):
+            safe_eval("factorial(100) + factorial(200)", timeout=-1)
+        assert safe_eval("factorial(5)", timeout=None) == 120
+
+    def test_tool_returns_error_string(self):
+        """Test that python_calc reports limits as errors instead of hanging."""
+        assert python_calc.invoke({"expression": "9 ** 9 ** 9"}).startswith("Error: Result too large")
+
 class TestPythonCalcTool:
     """Tests for the python_calc tool."""
 
@@ -151,6 +397,14 @@ class TestPythonCalcTool:
         result = python_calc.invoke({"expression": "10 / 2"})
         assert result == "5"  # Not "5.0"
 
+    def test_exact_modes(self):
+        """Test the mode and precision arguments of the tool."""
+        assert python_calc.invoke({"expression": "0.1 + 0.2", "mode": "decimal"}) == "0.3"
+        assert python_calc.invoke({"expression": "1/3 + 1/4", "mode": "fraction"}) == "7/12"
+        result = python_calc.invoke({"expression": "2 / 3", "mode": "decimal", "precision": 4})
+        assert result == "0.6667"
+        assert python_calc.invoke({"expression": "sqrt(-1)", "mode": "decimal"}).startswith("Error:")
+
     def test_actual_float_result(self):
         """Test that non-integer floats are preserved."""
         result = python_calc.invoke({"expression": "10 / 3"})
@@ -176,3 +430,94 @@ class TestPythonCalcTool:
         """Test a more complex expression."""
         result = python_calc.invoke({"expression": "(10 + 5) * 2 - 3"})
         assert result == "27"
+
+
+class TestPythonCalcBatchTool:
+    """Tests for the python_calc_batch tool."""
+
+    def test_evaluates_each_element(self):
+        """Test that one expression is evaluated for every set of inputs."""
+        result = python_calc_batch.invoke({
+            "expression": "price * (1 + rate / 100)",
+            "variables": {"price": [10, 20, 30], "rate": [5, 10, 50]},
+        })
+        assert result.splitlines() == ["0: 10.5", "1: 22", "2: 45"]
+
+    def test_matches_python_calc(self):
+        """Test that results equal python_calc on the substituted expression."""
+        expression = "sqrt(x) + sin(x) ** 2 - log10(x) + round(x / 3, 2)"
+        values = [1, 2.5, 7, 100]
+        lines = python_calc_batch.invoke({"expression": expression, "variables": {"x": values}}).splitlines()
+        for i, value in enumerate(values):
+            expected = python_calc.invoke({"expression": expression.replace("x", f"({value})")})
+            assert float(lines[i].split(": ", 1)[1]) == pytest.approx(float(expected))
+
+    def test_errors_reported_per_element(self):
+        """Test that failing elements report python_calc's error."""
+        result = python_calc_batch.invoke({
+            "expression": "1 / x + sqrt(y)",
+            "variables": {"x": [1, 0, 2], "y": [4, 4, -1]},
+        })
+        assert result.splitlines() == ["0: 3", "1: Error: Division by zero", "2: Error: math domain error"]
+
+    def test_combinatorics_and_comparisons(self):
+        """Test functions without ufuncs and chained comparisons."""
+        result = python_calc_batch.invoke({
+            "expression": "factorial(n)",
+            "variables": {"n": [5, 0, -1]},
+        })
+        assert result.splitlines() == ["0: 120", "1: 1", "2: Error: factorial() not defined for negative values"]
+
+        result = python_calc_batch.invoke({"expression": "2 < x <= 5", "variables": {"x": [1, 5, 6]}})
+        assert result.splitlines() == ["0: False", "1: True", "2: False"]
+
+    def test_mismatched_lengths_rejected(self):
+        """Test that variable lists of different lengths are rejected."""
+        result = python_calc_batch.invoke({"expression": "x + y", "variables": {"x": [1, 2], "y": [1]}})
+        assert result.startswith("Error")
+
+    def test_reserved_and_unknown_names(self):
+        """Test that built-in names cannot be rebound and unknown names fail."""
+        result = python_calc_batch.invoke({"expression": "pi * 2", "variables": {"pi": [3]}})
+        assert "reserved" in result
+        result = python_calc_batch.invoke({"expression": "y * 2", "variables": {"x": [3]}})
+        assert result == "Error: Unknown variable: y"
+
+
+class TestCalcWorkers:
+    """Tests for running the calculator tools in worker processes."""
+
+    @pytest.fixture
+    def calc_config(self):
+        """Config with two calculator workers; restores in-process mode afterwards."""
+        cfg = Config(
+            use_gemini=False,
+            gemini_api_key=None,
+            gemini_model="gemini-2.5-flash",
+            temperature=0.7,
+            thinking_level=None,
+            thinking_budget=0,
+            system_prompt_file="prompts/empty.md",
+            resources_dir="resources",
+            chunk_size=1000,
+            chunk_overlap=100,
+            calc_workers=2,
+        )
+        set_calc_config(cfg)
+        yield cfg
+        set_calc_config(replace(cfg, calc_workers=0))
+
+    def test_tools_give_same_results(self, calc_config):
+        """Test that pooled evaluation matches in-process evaluation."""
+        assert python_calc.invoke({"expression": "sqrt(144) + 1 / 4"}) == "12.25"
+        assert python_calc.invoke({"expression": "1 / 0"}) == "Error: Division by zero"
+        result = python_calc_batch.invoke({"expression": "x * 2", "variables": {"x": [1, 2]}})
+        assert result == "0: 2\n1: 4"
+
+    def test_pool_reused_for_same_settings(self, calc_config):
+        """Test that reconfiguring with unchanged settings keeps the warm pool."""
+        from ai_in_loop import tools
+
+        pool = tools._calc_pool
+        set_calc_config(calc_config)
+        assert tools._calc_pool is pool